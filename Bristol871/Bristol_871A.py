@@ -1,9 +1,10 @@
-from telnetlib import Telnet
 from serial import Serial
-import struct
 import numpy as np
-import os, datetime
-from time import strftime, localtime
+import os, re, datetime, threading
+from time import time, perf_counter
+from Bristol871.SCPI_Transport import TelnetTransport
+from Bristol871.RS422_Decoder import RS422Decoder, RecordRingBuffer, RECORD_DTYPE
+from Timing.Timestamps import format_timestamps
 
 INSTRUMENT_COMMANDS = {"MEAS", "READ", "FETC"}
 CALC_METHODS = {"STAR", "MAXM"}
@@ -13,9 +14,43 @@ PID_TYPES = {"PROP", "INT", "DER"}
 AVERAGE_OPTIONS = {"POW", "FREQ", "WAV", "WNUM"}
 ON_OFF = {"OFF", "ON"}
 CALIBRATION_METHODS = {"TIME", "TEMP"}
+DETECTOR_TYPES = {"CW", "PULS"}
 FRAME_RATES = {20, 50, 100, 250, 500, 1000}
 STATUS_BITS = {1 << i for i in range(12)}  # Valid bits for status enable
+STATUS_FLAGS = {  # Questionable Status Register bit: (flag name, description)
+    0: ("wavelength_already_read", "Wavelength already read for current scan"),
+    3: ("power_out_of_range", "Power value outside valid range"),
+    4: ("temperature_out_of_range", "Temperature value outside valid range"),
+    5: ("wavelength_out_of_range", "Wavelength value outside valid range"),
+    9: ("pressure_out_of_range", "Pressure value outside valid range"),
+    10: ("reference_not_stabilized", "Reference laser has not stabilized"),
+}
+STATUS_DTYPE = np.dtype([(name, "?") for name, _ in STATUS_FLAGS.values()])
+QUALITY_REJECT = sum(1 << bit for bit in (3, 4, 5, 9, 10))  # Status bits that invalidate a measurement
 VOLTAGE_RANGE = np.arange(-5., 5.1, .1)  # PID voltage range
+SETTING_HEADERS = {
+    "detector": ":SENS:DET:FUNC", "auto_exposure": ":SENS:EXP:AUTO",
+    "calibration_method": ":SENS:CALI:METH", "calibration_temp": ":SENS:CALI:TEMP",
+    "calibration_timer": ":SENS:CALI:TIM", "trigger_method": ":TRIG:SEQ:METH",
+    "frame_rate": ":TRIG:SEQ:RATE", "average_state": ":SENS:AVER:STAT",
+    "average_count": ":SENS:AVER:COUN",
+}
+SETTING_CHECKS = {  # Valid values and error message of each setting, shared by the setters and configure()
+    "detector": (DETECTOR_TYPES, "Invalid detector type."),
+    "auto_exposure": (ON_OFF, "Invalid auto exposure state."),
+    "calibration_method": (CALIBRATION_METHODS, "Invalid calibration method."),
+    "calibration_temp": (range(1, 51), "Calibration temperature must be in the range (1, 50)."),
+    "calibration_timer": (range(5, 1441), "Calibration timer must be in the range (5, 1440)."),
+    "trigger_method": (TRIGGER_METHODS, "Invalid trigger method."),
+    "frame_rate": (FRAME_RATES, "Invalid frame rate."),
+    "average_state": (ON_OFF, "Invalid average state."),
+    "average_count": (range(2, 129), "Average count must be in the range (2, 128)."),
+}
+CALIBRATION_SETTINGS = {"calibration_temp": "TEMP", "calibration_timer": "TIME"}  # Calibration method each one needs
+CACHED_SETTINGS = {":TRIG:SEQ:METH", ":SENS:CALI:METH", ":SENS:EXP:AUTO", ":TRIG:SEQ:RATE"}  # Served from the settings cache
+SETTING_VALUES = TRIGGER_METHODS | CALIBRATION_METHODS | ON_OFF | DETECTOR_TYPES  # Canonical short forms of setting values
+MMEM_CAPACITY = 1000000  # Measurements the MMEM buffer can hold
+BUFFER_DTYPE = RECORD_DTYPE  # MMEM and RS-422 records share the 20-byte "<dfII" layout
 
 class Bristol871(object):
     """Class representing a Bristol 871 wavelength meter.
@@ -24,25 +59,41 @@ class Bristol871(object):
         serial_port (Serial): Serial connection instance.
         tn (Telnet): Telnet connection instance.
         dev_addr (str): Device IP address.
+        idn (str): *IDN? reply received when connecting.
+        connect_report (dict): Seconds spent in each connection phase (tcp, drain, identify).
     """
 
     START_TOKEN = 0x7E
     ESCAPE_TOKEN = 0x7D
     ESCAPE_XOR = 0x20
     
-    def __init__(self, port_number: str, ip_addr: str, quiet: bool = False):
+    def __init__(self, port_number: str, ip_addr: str, quiet: bool = False, telnet_port: int = 23):
         """Initializes the Bristol 871 device with Telnet and Serial connections."""
         self.serial_port = Serial(port=port_number, baudrate=921600, timeout=5)
         self.dev_addr = ip_addr
-        self.tn = Telnet(ip_addr, 23)
+        self._settings = {}
+        self.timing_report = None
+        self.batch_stats = {"batches": 0, "commands": 0, "round_trips_saved": 0}
+        self.segments = None
+        self.segment_schedule = []
+        self._segment_data = []
+        self.stream_decoder = None
+        self.stream_buffer = None
+        self._stream_thread = None
+        self._stream_stop = threading.Event()
+        self.idn = None
+        self.connect_report = {}
 
-        try:
-            # Flush telnet buffer on initialization
-            [self.readline() for _ in range(8)]
+        start = perf_counter()
+        self.tn = TelnetTransport(ip_addr, telnet_port)
+        self.connect_report["tcp"] = perf_counter() - start
 
+        try:
+            self.handshake()
             if not quiet:
-                self.tn.write(b"*IDN?\r\n")
-                print(f"Connected to: {self.readline()}", "\n")
+                print(f"Connected to: {self.idn}")
+                print("Connection: " + ", ".join(f"{phase} {seconds * 1e3:.1f} ms"
+                                                 for phase, seconds in self.connect_report.items()), "\n")
         except Exception as e:
             print(f"Error initializing Bristol 871: {e}")
             self.__del__()
@@ -50,11 +101,26 @@ class Bristol871(object):
     def __del__(self):
         """Ensures the connection is closed when the object is deleted."""
         try:
+            self.stop_stream()
             self.tn.close()
             print(f"\nConnection to {self.dev_addr} closed.")
         except Exception as e:
             print(f"Error closing connection: {e}")
     
+    def handshake(self, quiet_period: float = 0.1, max_drain: float = 2) -> str:
+        """
+        Discards the Telnet banner as soon as the instrument stops sending it, then
+        confirms the connection with a single *IDN?. Phase times go to connect_report.
+        """
+        start = perf_counter()
+        self.tn.drain(quiet_period, max_drain)
+        self.connect_report["drain"] = perf_counter() - start
+
+        start = perf_counter()
+        self.idn = self.query("*IDN?")
+        self.connect_report["identify"] = perf_counter() - start
+        return self.idn
+
     def readline(self) -> str:
         """Reads a line from the Telnet buffer."""
         response = self.tn.read_until(b"\n", timeout=3).decode("utf-8")
@@ -68,22 +134,263 @@ class Bristol871(object):
         def __init__(self, message="Telnet buffer was empty, read timed out.") -> None:
             super().__init__(message)
 
+    class BatchError(Exception):
+        """Exception raised when commands in a batch report SCPI errors."""
+        def __init__(self, errors: dict, replies: list) -> None:
+            self.errors = errors
+            self.replies = replies
+            super().__init__("; ".join(f"{command}: {error}" for command, error in errors.items()))
+
     def write(self, message: str) -> None:
         """Sends WRITE command to the Bristol 871 device."""
+        self._invalidate_written(message)
         self.tn.write(f'{message}\r\n'.encode('utf-8'))
 
     def query(self, message: str) -> str:
-        """Sends QUERY command and reads the response."""
-        self.write(message)
+        """Sends QUERY command and reads the response as one transaction, so async queries cannot interleave."""
+        self._invalidate_written(message)
+        response = self.tn.query(message)
+        if not response:
+            raise self.EmptyBuffer()
+
+        return response
+
+    def query_block(self, *commands: str, timeout: float = 3) -> bytearray:
+        """
+        Sends commands, the last of which returns an IEEE-488.2 definite-length block,
+        and reads the block as one transaction. Returns the data part.
+        """
+        try:
+            return self.tn.query_block(*commands, timeout=timeout)
+        except TimeoutError:
+            raise self.EmptyBuffer("Block read timed out.")
+        except ConnectionError as e:
+            raise self.EmptyBuffer(str(e))
 
-        return self.readline()
+    async def awrite(self, message: str) -> None:
+        """Awaitable WRITE command, usable from any event loop."""
+        self._invalidate_written(message)
+        await self.tn.awaitable(self.tn.client.write(f'{message}\r\n'.encode('utf-8')))
+
+    async def aquery(self, message: str) -> str:
+        """Awaitable QUERY command, usable from any event loop."""
+        self._invalidate_written(message)
+        response = await self.tn.awaitable(self.tn.client.query(message))
+        if not response:
+            raise self.EmptyBuffer()
+
+        return response
+
+    async def afetch_buffer(self) -> np.ndarray:
+        """Awaitable version of fetch_buffer() for unsegmented acquisitions."""
+        block = await self.tn.awaitable(self.tn.client.query_block(':MMEM:CLOS', ':MMEM:DATA?'))
+        return self.decode_buffer(block)
     
+    @staticmethod
+    def split_reply(reply: str) -> list:
+        """Splits a compound SCPI reply at ';', ignoring separators inside quoted strings."""
+        return [unit.strip() for unit in re.findall(r'(?:"[^"]*"|[^;])+', reply)]
+
+    def batch(self, commands: list, check_errors: bool = True) -> list:
+        """
+        Sends several commands and queries joined by ';' in a single transmission and
+        reads all query replies from one response line.
+
+        With check_errors, a :SYST:ERR? is placed after every command, so errors are
+        attributed to the command that caused them without extra round trips.
+
+        Returns a list with the reply of each query and None for each command.
+        Raises BatchError if any command reported an error.
+        """
+        commands = [command.strip() for command in commands]
+        units, slots = [], []
+        for command in commands:
+            units.append(command)
+            slots.append((command, command.endswith('?')))
+            if check_errors:
+                units.append(':SYST:ERR?')
+                slots.append((command, None))
+
+        expected = sum(is_query is not False for _, is_query in slots)
+        if expected:
+            replies = self.split_reply(self.query(';'.join(units)))
+        else:
+            self.write(';'.join(units))
+            replies = []
+        if len(replies) != expected:
+            raise ValueError(f"Expected {expected} replies to batch, got {len(replies)}: {replies}")
+
+        results, errors = [], {}
+        reply_iter = iter(replies)
+        for command, is_query in slots:
+            if is_query is None:
+                error = next(reply_iter)
+                if not error.startswith('0'):
+                    errors[command] = error
+            elif is_query:
+                results.append(next(reply_iter))
+            else:
+                results.append(None)
+
+        self.batch_stats["batches"] += 1
+        self.batch_stats["commands"] += len(commands)
+        self.batch_stats["round_trips_saved"] += max(len(commands) - 1, 0)  # Added :SYST:ERR? checks not counted
+
+        if errors:
+            raise self.BatchError(errors, results)
+        return results
+
+    def configure(self, **settings) -> dict:
+        """
+        Applies several settings in one batch and reads back the current state of the
+        detector, auto exposure, calibration method, trigger method and frame rate,
+        plus every setting given. Keywords are the keys of SETTING_HEADERS.
+
+        Returns {setting: value read back from the instrument}.
+        """
+        unknown = set(settings) - set(SETTING_HEADERS)
+        if unknown:
+            raise ValueError(f"Unknown settings: {unknown}. Must be among {set(SETTING_HEADERS)}.")
+        settings = {name: value for name, value in settings.items() if value is not None}
+
+        method = settings.get("calibration_method")
+        for name, value in settings.items():
+            self.check_setting(name, value, method)
+
+        readback = ["detector", "auto_exposure", "calibration_method", "trigger_method", "frame_rate"]
+        readback += [name for name in settings if name not in readback]
+        commands = [f"{SETTING_HEADERS[name]} {value}" for name, value in settings.items()]
+        commands += [f"{SETTING_HEADERS[name]}?" for name in readback]
+
+        replies = self.batch(commands)[len(settings):]
+        state = dict(zip(readback, replies))
+        for name in readback:
+            header = SETTING_HEADERS[name]
+            if header in CACHED_SETTINGS:
+                self._settings[header] = int(state[name]) if name == "frame_rate" else self.canonical_setting(state[name])
+        return state
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # Settings cache
+    #
+    # Trigger method, calibration method, auto exposure and frame rate are kept in
+    # a local cache. Setters update it on write, getters only query the instrument
+    # on a cache miss. The cache is cleared after *RST and calibration. Values are
+    # cached in one canonical form (upper-case short form, ON/OFF, int frame rate),
+    # whether they were written or read back.
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _cached_query(self, header: str, convert=None):
+        """Returns a setting from the cache, querying the instrument on a miss."""
+        if header not in self._settings:
+            self._settings[header] = (convert or self.canonical_setting)(self.query(f'{header}?'))
+        return self._settings[header]
+
+    def _write_setting(self, header: str, value) -> None:
+        """Writes a setting to the instrument and stores it in the cache."""
+        self.write(f'{header} {value}')
+        self._settings[header] = self.canonical_setting(value)
+
+    @staticmethod
+    def canonical_setting(value):
+        """
+        Returns the form a setting value is cached in: numbers as they are, ON/OFF for 1/0,
+        and the short form of a known mnemonic (TEMPerature -> TEMP, INTernal -> INT).
+        """
+        if not isinstance(value, str):
+            return value
+        value = value.strip().upper()
+        value = {'1': 'ON', '0': 'OFF'}.get(value, value)
+        return next((short for short in SETTING_VALUES if value.startswith(short)), value)
+
+    @staticmethod
+    def header_nodes(header: str) -> tuple:
+        """
+        Splits a SCPI command header into upper-case nodes without the optional
+        [:SENSe] root and [:SEQuence] node, e.g. ':trigger:sequence:method' -> ('TRIGGER', 'METHOD').
+        """
+        nodes = [node for node in header.strip().upper().rstrip('?').split(':') if node]
+        if nodes and nodes[0].startswith('SENS'):
+            nodes = nodes[1:]
+        if len(nodes) > 1 and nodes[0].startswith('TRIG') and nodes[1].startswith('SEQ'):
+            nodes = nodes[:1] + nodes[2:]
+        return tuple(nodes)
+
+    @staticmethod
+    def same_header(a: tuple, b: tuple) -> bool:
+        """
+        True if one node tuple is a prefix of the other, each node matching in short or long
+        form (TRIG, TRIGGER). ('TRIG', 'RATE', 'ADJ') therefore matches ('TRIG', 'RATE').
+        """
+        return all(x.startswith(y) or y.startswith(x) for x, y in zip(a, b))
+
+    def _invalidate_written(self, message: str) -> None:
+        """Drops the cached settings a raw message may change, since it bypassed the setters."""
+        if not self._settings:
+            return
+        for unit in message.split(';'):
+            header = unit.split(maxsplit=1)[0] if unit.strip() else ''
+            if not header or header.endswith('?'):
+                continue
+            nodes = self.header_nodes(header)
+            if header.upper() == '*RST' or len(nodes) == 1 and nodes[0].startswith('CALI'):
+                self.invalidate_settings()                                      # Reset or calibration
+                return
+            for cached in list(self._settings):
+                if nodes and self.same_header(nodes, self.header_nodes(cached)):
+                    self._settings.pop(cached)
+
+    def invalidate_settings(self, *headers: str) -> None:
+        """Clears the given cached settings, or the whole cache if none are given."""
+        if not headers:
+            self._settings.clear()
+        for header in headers:
+            self._settings.pop(header, None)
+
+    @staticmethod
+    def same_setting(a, b) -> bool:
+        """
+        Compares two setting values, accepting SCPI short/long forms (TEMP, TEMPerature)
+        and 1/0 for ON/OFF.
+        """
+        a, b = (str(v).strip().upper() for v in (a, b))
+        a, b = ({'1': 'ON', '0': 'OFF'}.get(v, v) for v in (a, b))
+        try:
+            return float(a) == float(b)
+        except ValueError:
+            return bool(a) and bool(b) and (a.startswith(b) or b.startswith(a))
+
+    def verify_settings(self) -> dict:
+        """
+        Re-queries every cached setting and compares it with the cached value.
+        Returns {header: (cached, actual)} for mismatches; the cache is updated to the
+        instrument's values.
+        """
+        mismatches = {}
+        for header, cached in list(self._settings.items()):
+            actual = self.query(f'{header}?')
+            if not self.same_setting(cached, actual):
+                mismatches[header] = (cached, actual)
+                self._settings[header] = type(cached)(actual) if isinstance(cached, int) else self.canonical_setting(actual)
+        return mismatches
+
     @staticmethod
     def validate_input(value, valid_values, error_message):
         """Validates if a value is within allowed values."""
         if value not in valid_values:
             raise ValueError(error_message)
 
+    def check_setting(self, name: str, value, calibration_method: str = None) -> None:
+        """
+        Validates a value for one of the SETTING_HEADERS settings. Calibration temperature
+        and timer also need the matching calibration method, taken from calibration_method
+        if given, otherwise from the instrument (cached).
+        """
+        if name in CALIBRATION_SETTINGS:
+            if not self.same_setting(calibration_method or self.calibration_method, CALIBRATION_SETTINGS[name]):
+                raise ValueError('Calibration method incorrect.')
+        self.validate_input(value, *SETTING_CHECKS[name])
+
     @property
     def all(self, command: str) -> str:
         """
@@ -198,27 +505,120 @@ class Bristol871(object):
     def buffer_control(self, command: str):
         """Handles the memory buffer (INIT, OPEN, CLOS, DATA?)."""
         self.validate_input(command, {"INIT", "OPEN", "CLOS", "DATA?"}, "Invalid buffer command.")
-        self.write(f':MMEM:{command}\r\n')
+        self.write(f':MMEM:{command}')
 
-    def get_buffer(self, path: str, filename: str, acq_time: float, timestamps: list):
+    def read_block(self, timeout: float = 3) -> bytearray:
         """
-        Retrieves buffered data from the instrument and saves it as a CSV file.
+        Reads an IEEE-488.2 definite-length block (#<n><length><data>) into a
+        single preallocated bytearray and returns the data part.
         """
-        self.buffer_control('CLOS')
-        self.buffer_control('DATA?')
-        print('\nRetrieving data from Bristol buffer...')
-        print('Getting first character:', self.tn.rawq_getchar())
+        try:
+            return self.tn.read_block(timeout)
+        except TimeoutError:
+            raise self.EmptyBuffer("Block read timed out.")
+        except ConnectionError as e:
+            raise self.EmptyBuffer(str(e))
 
-        # Extract the total number of bytes in the buffer
-        num_bytes_char = int(self.tn.rawq_getchar())
-        total_bytes = sum(int(self.tn.rawq_getchar()) * 10 ** (num_bytes_char - i - 1) for i in range(num_bytes_char))
+    @staticmethod
+    def decode_buffer(block) -> np.ndarray:
+        """
+        Decodes a raw MMEM block into a structured array with fields wavelength,
+        power, status and scan_index. The array is a view on the block, no copy is made.
+        A trailing partial record is dropped with a warning.
+        """
+        num_samples, remainder = divmod(len(block), BUFFER_DTYPE.itemsize)
+        if remainder:
+            print(f"Warning: buffer block ends in a partial record ({remainder} of {BUFFER_DTYPE.itemsize} bytes), "
+                  f"which is dropped.")
+        return np.frombuffer(block, dtype=BUFFER_DTYPE, count=num_samples)
 
-        print("Total bytes:", total_bytes)
-        num_samples = total_bytes // 20
-        print("Number of Samples:", num_samples)
-        print("Total time elapsed:", acq_time)
-        print("Sample Rate:", num_samples / acq_time)
+    def fetch_buffer(self) -> np.ndarray:
+        """
+        Closes the buffer and retrieves all stored measurements as a structured array.
+        In segmented mode the last segment is drained and all segments are joined.
+        """
+        if self.segments is not None:
+            self.drain_segment(reopen=False)
+            data = np.concatenate(self._segment_data)
+            self._segment_data = []
+            self.segment_schedule = []
+            return data
+
+        return self.decode_buffer(self.query_block(':MMEM:CLOS', ':MMEM:DATA?'))
+
+    @staticmethod
+    def plan_segments(duration: float, frame_rate: float, capacity: int = MMEM_CAPACITY, fill: float = 0.9) -> list:
+        """
+        Returns the elapsed times [s] at which the MMEM buffer has to be drained so that
+        no segment holds more than `fill` of its `capacity` at the given frame rate.
+        An empty list means the whole run fits into a single buffer.
+        """
+        segment_time = capacity * fill / frame_rate
+        if duration * frame_rate <= capacity * fill:
+            return []
+        return [segment_time * (k + 1) for k in range(int(np.ceil(duration / segment_time)) - 1)]
+
+    def begin_segments(self, duration: float, frame_rate: float, capacity: int = MMEM_CAPACITY):
+        """
+        Enables segmented acquisition for a run of `duration` seconds. Call right after
+        the buffer is opened, then call poll_segments() from the measurement loop.
+        """
+        self.segment_schedule = self.plan_segments(duration, frame_rate, capacity)
+        self.segments = []
+        self._segment_data = []
+        self._segment_opened = time()
+        print(f"Bristol buffer will be drained in {len(self.segment_schedule) + 1} segments.")
+
+    def poll_segments(self, elapsed: float) -> bool:
+        """
+        Drains and re-opens the buffer if the next scheduled segment boundary has passed.
+        Returns True if a segment was drained.
+        """
+        if not self.segment_schedule or elapsed < self.segment_schedule[0]:
+            return False
+        self.segment_schedule.pop(0)
+        self.drain_segment(reopen=True)
+        return True
 
+    def drain_segment(self, reopen: bool = True):
+        """
+        Closes the buffer, dumps its contents and, if `reopen`, clears and re-opens it.
+        The segment's scan-index range and the dead time until re-opening are appended
+        to self.segments.
+        """
+        closed = time()
+        data = self.decode_buffer(self.query_block(':MMEM:CLOS', ':MMEM:DATA?'))
+        self._segment_data.append(data)
+
+        opened = None
+        if reopen:
+            self.buffer_control('INIT')
+            self.buffer_control('OPEN')
+            opened = time()
+
+        first = int(data["scan_index"][0]) if len(data) else None
+        last = int(data["scan_index"][-1]) if len(data) else None
+        previous_last = next((seg["last_scan_index"] for seg in reversed(self.segments) if seg["last_scan_index"] is not None), None)
+        step = (first - previous_last) % 2**32 if first is not None and previous_last is not None else 0
+        if 0 < step < 2**31:                                                    # Forward, across a rollover too
+            missed = step - 1
+        else:
+            missed = None                                                       # First segment or scan index restarted
+        self.segments.append({
+            "segment": len(self.segments),
+            "opened": self._segment_opened,
+            "closed": closed,
+            "num_samples": len(data),
+            "first_scan_index": first,
+            "last_scan_index": last,
+            "missed_frames": missed,
+            "gap": opened - closed if opened is not None else None,
+        })
+        self._segment_opened = opened
+
+    @staticmethod
+    def unique_file_path(path: str, filename: str) -> str:
+        """Returns a file path in today's folder under `path`, numbering the name if it exists."""
         # Generate file path with unique naming
         folder_name = datetime.datetime.now().strftime("%m-%d-%Y")
         folder_path = os.path.join(path, folder_name)
@@ -226,24 +626,172 @@ class Bristol871(object):
 
         counter = 1
         original_filename = filename
+        extension = os.path.splitext(original_filename)[1]
         while os.path.isfile(os.path.join(folder_path, filename)):
-            filename = f"{original_filename.split('.')[0]}_{counter}.csv"
+            filename = f"{original_filename.split('.')[0]}_{counter}{extension}"
             counter += 1
 
-        file_path = os.path.join(folder_path, filename)
+        return os.path.join(folder_path, filename)
+
+    def save_segments(self, path: str, filename: str) -> str:
+        """
+        Saves the segment log of a segmented acquisition as a CSV file and returns the file path.
+        """
+        file_path = self.unique_file_path(path, filename)
+        columns = ["segment", "opened", "closed", "num_samples", "first_scan_index", "last_scan_index", "missed_frames", "gap"]
+        with open(file_path, "w") as log:
+            log.write(",".join(columns) + "\n")
+            for seg in self.segments:
+                log.write(",".join("" if seg[col] is None else str(seg[col]) for col in columns) + "\n")
+
+        return file_path
+
+    @staticmethod
+    def save_buffer(path: str, filename: str, data: np.ndarray, timestamps: list) -> str:
+        """
+        Saves decoded buffer data as a CSV file and returns the file path.
+        """
+        file_path = Bristol871.unique_file_path(path, filename)
+
+        num_rows = min(len(data), len(timestamps))
+        rows = zip(timestamps[:num_rows],
+                   data["status"][:num_rows].tolist(),
+                   data["wavelength"][:num_rows].tolist(),
+                   data["power"][:num_rows].tolist())
+        with open(file_path, "w") as log:
+            log.write("Timestamp,Status,Wavelength,Intensity\n")
+            log.writelines(f"{timestamp},{status:05d},{wvl:.7f},{pwr:.3f}\n" for timestamp, status, wvl, pwr in rows)
+
+        return file_path
+
+    @staticmethod
+    def unwrap_scan_index(scan_index: np.ndarray) -> np.ndarray:
+        """Returns the 32-bit scan index as int64, unwrapped across rollovers."""
+        index = scan_index.astype(np.int64)
+        rollovers = np.concatenate(([0], np.cumsum(np.diff(index) < -2**31)))
+        return index + rollovers * 2**32
+
+    @staticmethod
+    def fit_frame_period(scan_indices, host_times):
+        """
+        Least-squares fit of host time against scan index. Returns (period, offset) so
+        that host time = offset + period * scan index.
+        """
+        period, offset = np.polyfit(np.asarray(scan_indices, dtype=np.float64),
+                                    np.asarray(host_times, dtype=np.float64), 1)
+        return float(period), float(offset)
+
+    def reconstruct_timestamps(self, data: np.ndarray, start_time: float, frame_period: float, acq_time: float = None,
+                               trigger_times=None):
+        """
+        Rebuilds per-sample host times from the buffered scan index instead of a nominal grid.
+
+        The frame period is fitted against host-clock anchors: the segment open/close times
+        in segmented mode, otherwise the run start and end (start_time + acq_time). The fit
+        is used if it is within 1 % of frame_period, otherwise the nominal period is kept.
+        If hardware trigger_times are given (one per external trigger, the first one producing
+        the first buffered frame), they are the anchors instead, and every frame with a trigger
+        gets its trigger time directly; only frames beyond the last trigger use the fit.
+
+        Returns (times, report): epoch times [s] as a float64 array, and a dict with the
+        missing frames, gap positions, duplicate and out-of-order counts and both periods.
+        """
+        index = self.unwrap_scan_index(data["scan_index"])
+        steps = np.diff(index)
+        gap_positions = np.flatnonzero(steps > 1)
+
+        anchor_index, anchor_time = [index[0]], [start_time]
+        if trigger_times is not None:
+            trigger_times = np.asarray(trigger_times, dtype=np.float64)
+            anchor_index, anchor_time = index[0] + np.arange(len(trigger_times)), trigger_times
+        elif self.segments:
+            start = 0                                                           # Segments are located by sample count,
+            for seg in self.segments:                                           # so anchors use the unwrapped index
+                stop = start + seg["num_samples"]
+                if seg["num_samples"] and stop <= len(index):
+                    if seg["opened"] is not None and seg["segment"] > 0:
+                        anchor_index.append(index[start])
+                        anchor_time.append(seg["opened"])
+                    anchor_index.append(index[stop - 1])
+                    anchor_time.append(seg["closed"])
+                start = stop
+        elif acq_time is not None:
+            anchor_index.append(index[-1])
+            anchor_time.append(start_time + acq_time)
+
+        period, offset = frame_period, start_time - index[0] * frame_period
+        fitted = None
+        if len(set(anchor_index)) > 1:
+            fitted, fitted_offset = self.fit_frame_period(anchor_index, anchor_time)
+            if abs(fitted - frame_period) < 0.01 * frame_period:
+                period, offset = fitted, fitted_offset
+
+        report = {
+            "num_samples": len(index),
+            "first_scan_index": int(index[0]),
+            "last_scan_index": int(index[-1]),
+            "missing_frames": int(np.sum(steps[gap_positions] - 1)),
+            "gaps": np.column_stack((gap_positions + 1, steps[gap_positions] - 1)),  # (sample, frames missing before it)
+            "duplicates": int(np.count_nonzero(steps == 0)),
+            "out_of_order": int(np.count_nonzero(steps < 0)),
+            "nominal_period": frame_period,
+            "fitted_period": fitted,
+            "hardware_times": 0,
+        }
+        times = offset + index * period
+        if trigger_times is not None and len(trigger_times):
+            position = index - index[0]
+            triggered = (position >= 0) & (position < len(trigger_times))
+            times[triggered] = trigger_times[position[triggered]]
+            report["hardware_times"] = int(np.count_nonzero(triggered))
+        return times, report
+
+    def get_buffer(self, path: str, filename: str, acq_time: float, timestamps: list,
+                   start_time: float = None, frame_period: float = None, trigger_times=None):
+        """
+        Retrieves buffered data from the instrument and saves it as a CSV file.
+        If start_time and frame_period are given, the timestamps are rebuilt from the
+        buffered scan index and `timestamps` is ignored. Hardware trigger_times (epoch
+        seconds, e.g. counter edge timestamps) are used directly for the frames they
+        triggered; the start_time/frame_period fit only fills in the rest.
+        """
+        print('\nRetrieving data from Bristol buffer...')
+        data = self.fetch_buffer()
+
+        num_samples = len(data)
+        print("Total bytes:", data.nbytes)
+        print("Number of Samples:", num_samples)
+        print("Total time elapsed:", acq_time)
+        print("Sample Rate:", num_samples / acq_time)
+        print("Samples failing quality mask:", num_samples - int(np.count_nonzero(self.quality_mask(data["status"]))))
+
+        if start_time is not None and frame_period is not None and num_samples:
+            times, report = self.reconstruct_timestamps(data, start_time, frame_period, acq_time, trigger_times)
+            timestamps = format_timestamps(times)
+            self.timing_report = report
+            print(f"Scan index {report['first_scan_index']}-{report['last_scan_index']}: "
+                  f"{report['missing_frames']} frames missing in {len(report['gaps'])} gaps, "
+                  f"{report['duplicates']} duplicates, {report['out_of_order']} out of order.")
+            if trigger_times is not None:
+                print(f"{report['hardware_times']} of {num_samples} samples timestamped by {len(trigger_times)} hardware triggers.")
+            if report["fitted_period"] is not None:
+                drift = (report["fitted_period"] / frame_period - 1) * 1e6
+                print(f"Frame period: nominal {frame_period * 1e3:.6f} ms, fitted {report['fitted_period'] * 1e3:.6f} ms ({drift:+.1f} ppm).")
 
         # Retrieve and save data
         try:
-            with open(file_path, "w") as log:
-                log.write("Timestamp,Status,Wavelength,Intensity\n")
-                for timestamp in timestamps[:num_samples]:
-                    raw_data = b"".join(self.tn.rawq_getchar() for _ in range(20))
-                    wvl, pwr, status, _ = struct.unpack("<dfII", raw_data)
-                    log.write(f"{timestamp},{str(status).zfill(5)},{wvl:.7f},{pwr:.3f}\n")
-
+            self.save_buffer(path, filename, data, timestamps)
             print(f"Successfully saved {len(timestamps[:num_samples])} measurements from Bristol buffer.")
+            if self.segments:
+                gaps = [seg["gap"] for seg in self.segments if seg["gap"] is not None]
+                print(f"{len(self.segments)} segments, {sum(seg['missed_frames'] or 0 for seg in self.segments)} frames missed, "
+                      f"{sum(gaps):.3f} s total gap.")
+                self.save_segments(path, f"{filename.split('.')[0]}_segments.csv")
         except Exception as e:
             print(f"Error saving data: {e}")
+        self.segments = None
+
+        return data
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     # SENSe Subsystem
@@ -255,11 +803,8 @@ class Bristol871(object):
         """
         Sets/Queries the number of readings to be averaged.
         """
-        values = range(2,129)
-        if value in values:
-            self.write(f':SENS:AVER:COUN {value}')                              # RST Value = 2
-        else:
-            self.validate_input(value, values, f'Invalid value. Must be one of {values}.')
+        self.check_setting("average_count", value)
+        self.write(f':SENS:AVER:COUN {value}')                                  # RST Value = 2
 
         return self.query(':SENS:AVER:COUN?')
     
@@ -277,7 +822,7 @@ class Bristol871(object):
         """
         Sets/Queries if data is currently being averaged.
         """
-        self.validate_input(value, ON_OFF, f'Invalid value. Must be one of {ON_OFF}.')
+        self.check_setting("average_state", value)
         self.write(f':SENS:AVER:STAT {value}')
 
         return self.query(f':SENS:AVER:STAT?')
@@ -286,20 +831,21 @@ class Bristol871(object):
         """
         Initiates a calibration of the instrument.
         """
+        self.invalidate_settings()
         return self.write(':SENS:CALI')
     
     @property
     def calibration_method(self):
         """
-        Initiates a calibration of the instrument.
+        Queries the calibration method (cached).
         """
-        return self.query(':SENS:CALI:METH?')
+        return self._cached_query(':SENS:CALI:METH')
     
     @calibration_method.setter
     def calibration_method(self, value: str):
         """Sets the calibration method (TIME or TEMP)."""
-        self.validate_input(value, CALIBRATION_METHODS, "Invalid calibration method.")
-        self.write(f':SENS:CALI:METH {value}')                            # RST = TEMP
+        self.check_setting("calibration_method", value)
+        self._write_setting(':SENS:CALI:METH', value)                      # RST = TEMP
 
     def calibration_temp(self, value: float):
         """
@@ -307,15 +853,9 @@ class Bristol871(object):
         calibration of the instrument. The change is specified in 1/10th°C increments so a
         value of 10 corresonds to a 1 °C change.
         """
-        values = range(1,51)
-        if self.query(':SENS:CALI:METH?') == 'TEMPerature':
-            if value not in values:
-                self.validate_input(value, values, f'Input value must be in the range{min(values), max(values)}.')
-            else:
-                self.write(f':SENS:CALI:TEMP {value}')                          # RST Value = 5
-                print(f'Temperature delta =       {value / 10}°C.')
-        else:
-            raise ValueError('Calibration method incorrect.')
+        self.check_setting("calibration_temp", value)
+        self.write(f':SENS:CALI:TEMP {value}')                                  # RST Value = 5
+        print(f'Temperature delta =       {value / 10}°C.')
 
         return self.query(':SENS:CALI:TEMP?')
 
@@ -324,15 +864,9 @@ class Bristol871(object):
         Sets/Queries the time between automatic calibrations of the instrument. The time
         is specified in minutes.
         """
-        values = range(5,1441)
-        if self.query(':SENS:CALI:METH?') == 'TIME':
-            if value not in values:
-                self.validate_input(value, values, f'Input value must be in the range{min(values), max(values)}.')
-            else:
-                self.write(f':SENS:CALI:TIM {value}')                           # RST Value = 30
-                print(f'Time delta is {value} min.')
-        else:
-            raise ValueError('Calibration method incorrect.')
+        self.check_setting("calibration_timer", value)
+        self.write(f':SENS:CALI:TIM {value}')                                   # RST Value = 30
+        print(f'Time delta is {value} min.')
 
         return self.query(':SENS:CALI:TIM?')
     
@@ -342,18 +876,15 @@ class Bristol871(object):
         pulsed laser source. For a pulsed laser source, measurements without sufficient
         intensity on the detector are not reported.
         """
-        values = {'CW', 'PULS'}
-        if value not in values:
-            self.validate_input(value, values, f'Input value must be one of {values}.')
-        else:
-            self.write(f":SENS:DET:FUNC {value}")                               # RST Value = CW
+        self.check_setting("detector", value)
+        self.write(f":SENS:DET:FUNC {value}")                                   # RST Value = CW
 
         return self.query(':SENS:DET:FUNC?')
     
     @property
     def auto_exposure(self):
-        """Queries the state of the Auto Exposure function."""
-        return self.query(':SENS:EXP:AUTO?')
+        """Queries the state of the Auto Exposure function (cached)."""
+        return self._cached_query(':SENS:EXP:AUTO')
     
     @auto_exposure.setter
     def auto_exposure(self, value: str):
@@ -362,8 +893,8 @@ class Bristol871(object):
         turned on the instrument modifies the exposure time dynamically to maintain the
         optimal detector signal.
         """
-        self.validate_input(value, ON_OFF, "Invalid auto exposure state.")
-        self.write(f':SENS:EXP:AUTO {value}')                               # RST Value = ON
+        self.check_setting("auto_exposure", value)
+        self._write_setting(':SENS:EXP:AUTO', value)                        # RST Value = ON
     
     def pid_error(self):
         """
@@ -494,19 +1025,19 @@ class Bristol871(object):
 
     @property
     def trigger_method(self):
-        """Queries the current trigger method."""
-        return self.query(':TRIG:SEQ:METH?')
+        """Queries the current trigger method (cached)."""
+        return self._cached_query(':TRIG:SEQ:METH')
 
     @trigger_method.setter
     def trigger_method(self, method: str):
         """Sets the trigger method being used for data collection."""
-        self.validate_input(method, TRIGGER_METHODS, "Invalid trigger method.")
-        self.write(f':TRIG:SEQ:METH {method}')
+        self.check_setting("trigger_method", method)
+        self._write_setting(':TRIG:SEQ:METH', method)
 
     @property
     def frame_rate(self):
-        """Gets the measurement frame rate."""
-        return int(self.query(':TRIG:SEQ:RATE?'))
+        """Gets the measurement frame rate (cached)."""
+        return self._cached_query(':TRIG:SEQ:RATE', int)
     
     @frame_rate.setter
     def frame_rate(self, value: int):
@@ -518,8 +1049,8 @@ class Bristol871(object):
         VIS \ NIR Model: { 20 | 50 | 100 | 250 | 500 | 1000}
         NIR2 Model: { 250 | 500 | 750 | 1000 | 1250 | 1500}
         """
-        self.validate_input(value, FRAME_RATES, "Invalid frame rate.")
-        self.write(f':TRIG:SEQ:RATE {value}')
+        self.check_setting("frame_rate", value)
+        self._write_setting(':TRIG:SEQ:RATE', value)
     
     def auto_frame_rate(self):
         """
@@ -528,6 +1059,7 @@ class Bristol871(object):
         50% saturation.
         """
         self.write(':TRIG:SEQ:RATE:ADJ')
+        self.invalidate_settings(':TRIG:SEQ:RATE')
         
         return self.query(':TRIG:SEQ:RATE:ADJ?')
 
@@ -588,39 +1120,110 @@ class Bristol871(object):
         of data must be read before continuing normal operations.
         """
         return self.query(':SYSTem:HELP:HEADers?')
+
+    def system_reset(self):
+        """
+        Resets the instrument to its *RST default settings and clears the settings cache.
+        """
+        self.invalidate_settings()
+        self.write('*RST')
     
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # RS-422 real-time stream
+    #
+    # Every measurement is also sent over the RS-422 port as it is taken. The
+    # background reader drains that stream into a fixed-size ring buffer, so live
+    # data is available during a run without any Telnet round trips.
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def start_stream(self, capacity: int = 2**20):
+        """
+        Starts the background RS-422 reader. The last `capacity` records are kept
+        in self.stream_buffer, a RecordRingBuffer.
+        """
+        if self._stream_thread is not None and self._stream_thread.is_alive():
+            return
+        self.stream_decoder = RS422Decoder()
+        self.stream_buffer = RecordRingBuffer(capacity)
+        self._stream_stop.clear()
+        self.serial_port.reset_input_buffer()
+        self._stream_thread = threading.Thread(target=self._stream_worker, name="Bristol871-RS422", daemon=True)
+        self._stream_thread.start()
+
+    def stop_stream(self):
+        """Stops the background RS-422 reader. Buffered records remain available."""
+        if self._stream_thread is None:
+            return
+        self._stream_stop.set()
+        self._stream_thread.join()
+        self._stream_thread = None
+
+    def _stream_worker(self):
+        """Reads everything waiting on the serial port, decodes it and appends it to the ring buffer."""
+        previous_timeout = self.serial_port.timeout
+        self.serial_port.timeout = 0.05                                         # Bounds the delay of stop_stream
+        try:
+            while not self._stream_stop.is_set():
+                chunk = self.serial_port.read(max(self.serial_port.in_waiting, 1))
+                if chunk:
+                    self.stream_buffer.write(self.stream_decoder.feed(chunk))
+        except Exception as e:
+            print(f"RS-422 stream stopped: {e}")
+        finally:
+            self.serial_port.timeout = previous_timeout
+
+    @property
+    def live_wavelength(self):
+        """Returns the most recent wavelength from the RS-422 stream, or None if none was received."""
+        record = self.stream_buffer.latest() if self.stream_buffer is not None else None
+        return None if record is None else float(record["wavelength"])
+
+    def stream_snapshot(self, n: int = None) -> np.ndarray:
+        """Returns a copy of the most recent n streamed records (all buffered records by default)."""
+        return self.stream_buffer.snapshot(n)
+
+    def stream_block(self, index: int = 0):
+        """
+        Returns the records streamed since `index` as (records, next_index, lost);
+        pass next_index back in to read consecutive blocks without gaps.
+        """
+        return self.stream_buffer.read_since(index)
+
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     # Complementary functions
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+    @staticmethod
+    def decode_status(status: np.ndarray) -> np.ndarray:
+        """
+        Decodes an array of status words (e.g. data["status"] of a buffer dump or an
+        RS-422 batch) into a structured array with one boolean field per STATUS_FLAGS bit.
+        """
+        status = np.asarray(status, dtype=np.uint32)
+        flags = np.empty(status.shape, dtype=STATUS_DTYPE)
+        for bit, (name, _) in STATUS_FLAGS.items():
+            flags[name] = (status & np.uint32(1 << bit)) != 0
+        return flags
+
+    @staticmethod
+    def quality_mask(status: np.ndarray, reject: int = QUALITY_REJECT) -> np.ndarray:
+        """
+        Returns True for every status word with none of the `reject` bits set. By default
+        samples with power, temperature, wavelength or pressure out of range, or an
+        unstabilized reference laser, are rejected.
+        """
+        return (np.asarray(status, dtype=np.uint32) & np.uint32(reject)) == 0
+
     def display_status(self):
         """Decodes and prints the status register with descriptions."""
         
         # Query instrument status register
         status_value = int(self.instrument_status)
-        
-        # Convert to 32-bit binary representation
-        status_bin = [int(i) for i in f"{status_value:b}".zfill(32)]
-        
-        # Questionable Status Register Bit Mapping
-        STATUS_BITS = {
-            0: "Wavelength already read for current scan",
-            1: "(not used)",
-            2: "(not used)",
-            3: "Power value outside valid range",
-            4: "Temperature value outside valid range",
-            5: "Wavelength value outside valid range",
-            6: "(not used)",
-            7: "(not used)",
-            8: "(not used)",
-            9: "Pressure value outside valid range",
-            10: "Reference laser has not stabilized",
-        }
 
         print("Status Decoded:")
-        for i, bit in enumerate(reversed(status_bin)):  
-            if bit and i in STATUS_BITS:  # Print only relevant status bits
-                print(f"Bit {i}: {STATUS_BITS[i]} (Status = {bit})")
+        for i, (_, description) in STATUS_FLAGS.items():  # Print only relevant status bits
+            if status_value >> i & 1:
+                print(f"Bit {i}: {description} (Status = 1)")
 
 if __name__ == "__main__":
     Bristol871()
@@ -0,0 +1,287 @@
+# Bristol 871A simulator
+#
+# Serves the SCPI subset used by Bristol871 on a local TCP port and emits the
+# escaped, 0x7E-framed RS-422 records on a pseudo-terminal, so the driver,
+# the decoders and the timing loops can be exercised without the instrument.
+#
+# Usage (Linux):
+#   python -m Bristol871.Bristol_871A_Simulator --port 2323 --frame-rate 1000
+#   python -m Bristol871.Bristol_871A_Simulator --benchmark --mmem-samples 1000000
+
+import os, tty, time, random, argparse, threading, socketserver
+import numpy as np
+from Bristol871.RS422_Decoder import RECORD_DTYPE, START_TOKEN, ESCAPE_TOKEN, ESCAPE_XOR
+from Bristol871.Bristol_871A import Bristol871, MMEM_CAPACITY
+
+IDN = "Bristol Instruments,871A-VIS,000000,SIMULATOR"
+DEFAULT_SETTINGS = {
+    ":TRIG:SEQ:METH": "INT", ":TRIG:SEQ:RATE": "1000", ":SENS:CALI:METH": "TEMP",
+    ":SENS:CALI:TEMP": "5", ":SENS:CALI:TIM": "30", ":SENS:EXP:AUTO": "ON",
+    ":SENS:DET:FUNC": "CW", ":SENS:AVER:STAT": "OFF", ":SENS:AVER:COUN": "2",
+    ":STAT:QUES:ENAB": "0", ":CALC:DELT:METH": "STAR",
+}
+
+
+class SimulatedBristol871(object):
+    """Simulated Bristol 871A with a SCPI Telnet port and an RS-422 pseudo-terminal.
+
+    Attributes:
+        address (tuple): (host, port) of the SCPI server once started.
+        serial_port (str): Path of the pseudo-terminal to open with serial.Serial.
+        frame_rate (int): Measurements per second; follows :TRIG:SEQ:RATE.
+        mmem_samples (int): If set, :MMEM:DATA? always returns this many records;
+            otherwise it returns the frames taken between :MMEM:OPEN and :MMEM:CLOS.
+        drop_rate (float): Probability that a frame is not sent on the RS-422 port.
+        jitter (float): Standard deviation [s] of the RS-422 frame emission time.
+        frames_sent (int): RS-422 frames written to the pseudo-terminal.
+        frames_dropped (int): RS-422 frames dropped on purpose or because nobody read the port.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, frame_rate: int = 1000, mmem_samples: int = None,
+                 drop_rate: float = 0.0, jitter: float = 0.0, banner_lines: int = 8, seed: int = None):
+        self.host, self.port = host, port
+        self.frame_rate = frame_rate
+        self.mmem_samples = mmem_samples
+        self.drop_rate = drop_rate
+        self.jitter = jitter
+        self.banner_lines = banner_lines
+        self.random = random.Random(seed)
+        self.settings = dict(DEFAULT_SETTINGS, **{":TRIG:SEQ:RATE": str(frame_rate)})
+        self.errors = []
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self._t0 = time.perf_counter()
+        self._mmem_open = None
+        self._mmem_range = (0, 0)
+        self._stop = threading.Event()
+        self._server = None
+        self._threads = []
+        self.address = None
+        self.serial_port = None
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # Measurement model
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def scan_index_at(self, t: float) -> int:
+        """Returns the scan index of the frame taken at perf_counter() time t."""
+        return int((t - self._t0) * self.frame_rate)
+
+    def make_records(self, first: int, count: int) -> np.ndarray:
+        """Returns `count` consecutive simulated records starting at scan index `first`."""
+        index = np.arange(first, first + count, dtype=np.int64)
+        records = np.zeros(count, dtype=RECORD_DTYPE)
+        records["scan_index"] = index.astype(np.uint32)
+        records["wavelength"] = 770.108 + 1e-6 * np.sin(index / 1000) + 1e-7 * np.random.standard_normal(count)
+        records["power"] = 0.5 + 0.001 * np.random.standard_normal(count)
+        records["status"] = 0
+        return records
+
+    @staticmethod
+    def frame(record: np.ndarray) -> bytes:
+        """Escapes one record and prefixes it with the START token."""
+        escape, start = bytes([ESCAPE_TOKEN]), bytes([START_TOKEN])
+        raw = record.tobytes()
+        raw = raw.replace(escape, bytes([ESCAPE_TOKEN, ESCAPE_TOKEN ^ ESCAPE_XOR]))
+        raw = raw.replace(start, bytes([ESCAPE_TOKEN, START_TOKEN ^ ESCAPE_XOR]))
+        return start + raw
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # SCPI
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def mmem(self, command: str):
+        """Handles :MMEM commands. Returns the data block for DATA?, else None."""
+        now = time.perf_counter()
+        if command == "INIT":
+            self._mmem_open, self._mmem_range = None, (0, 0)
+        elif command == "OPEN":
+            self._mmem_open = self.scan_index_at(now)
+        elif command in ("CLOS", "CLOSE") and self._mmem_open is not None:
+            last = min(self.scan_index_at(now), self._mmem_open + MMEM_CAPACITY)
+            self._mmem_range, self._mmem_open = (self._mmem_open, last), None
+        elif command == "DATA?":
+            if self.mmem_samples is not None:
+                first, count = self.scan_index_at(now), self.mmem_samples
+            else:
+                first, count = self._mmem_range[0], self._mmem_range[1] - self._mmem_range[0]
+            data = self.make_records(first, count).tobytes()
+            length = str(len(data)).encode()
+            return b"#" + str(len(length)).encode() + length + data
+        return None
+
+    def execute(self, unit: str):
+        """Executes one SCPI message unit. Returns a str reply, a bytes block, or None."""
+        header, _, argument = unit.strip().partition(" ")
+        header = header.upper()
+        if not header:
+            return None
+        if header == "*IDN?":
+            return IDN
+        if header in ("*RST",):
+            self.settings = dict(DEFAULT_SETTINGS)
+            self.frame_rate = int(self.settings[":TRIG:SEQ:RATE"])
+            return None
+        if header in ("*CLS", ":CALC:RES", ":SENS:CALI", ":TRIG:SEQ:RATE:ADJ"):
+            return None
+        if header in ("*OPC?", ":TRIG:SEQ:RATE:ADJ?"):
+            return "1"
+        if header == ":SYST:ERR?":
+            return self.errors.pop(0) if self.errors else '0,"No error"'
+        if header == ":STAT:QUES:COND?":
+            return "0"
+        if header.startswith(":MMEM:"):
+            return self.mmem(header[len(":MMEM:"):])
+        if header.endswith("?") and header[:-1] in self.settings:
+            return self.settings[header[:-1]]
+        if header in self.settings and argument:
+            self.settings[header] = argument.strip()
+            if header == ":TRIG:SEQ:RATE":
+                self.frame_rate = int(argument)
+            return None
+        if header in (":READ:WAV?", ":MEAS:WAV?", ":FETC:WAV?"):
+            return f"{self.make_records(self.scan_index_at(time.perf_counter()), 1)['wavelength'][0]:.7f}"
+        if header in (":READ:POW?", ":MEAS:POW?", ":FETC:POW?"):
+            return f"{self.make_records(self.scan_index_at(time.perf_counter()), 1)['power'][0]:.3f}"
+        self.errors.append('-113,"Undefined header"')
+        return None
+
+    def _handler(self):
+        simulator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for k in range(simulator.banner_lines):
+                    self.wfile.write(f"Bristol Instruments 871A simulator, banner line {k + 1}\r\n".encode())
+                for line in self.rfile:
+                    replies = []
+                    for unit in line.decode("utf-8", "replace").strip().split(";"):
+                        reply = simulator.execute(unit)
+                        if isinstance(reply, bytes):
+                            self.wfile.write(reply)
+                        elif reply is not None:
+                            replies.append(reply)
+                    if replies:
+                        self.wfile.write((";".join(replies) + "\r\n").encode())
+
+        return Handler
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # RS-422
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _serial_worker(self, master: int):
+        """Writes one frame per frame period to the pseudo-terminal, with drops and jitter."""
+        index = self.scan_index_at(time.perf_counter())
+        due = self._t0 + index / self.frame_rate
+        while not self._stop.is_set():
+            emit = due + (self.random.gauss(0, self.jitter) if self.jitter else 0)
+            delay = emit - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if self.random.random() >= self.drop_rate:
+                try:
+                    os.write(master, self.frame(self.make_records(index, 1)[0]))
+                    self.frames_sent += 1
+                except BlockingIOError:
+                    self.frames_dropped += 1                                   # Nobody is reading the port
+            else:
+                self.frames_dropped += 1
+            index += 1
+            due += 1 / self.frame_rate
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # Control
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def start(self):
+        """Starts the SCPI server and the RS-422 pseudo-terminal; returns self."""
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        os.set_blocking(master, False)
+        self._pty = (master, slave)
+        self.serial_port = os.ttyname(slave)
+
+        self._threads = [
+            threading.Thread(target=self._server.serve_forever, name="Bristol-SCPI-sim", daemon=True),
+            threading.Thread(target=self._serial_worker, args=(master,), name="Bristol-RS422-sim", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """Stops both interfaces."""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+        for fd in getattr(self, "_pty", ()):
+            os.close(fd)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def run_benchmark(simulator: SimulatedBristol871, queries: int = 200, stream_time: float = 2.0):
+    """Measures query latency, MMEM dump throughput and RS-422 stream decoding against the simulator."""
+    host, port = simulator.address
+    b = Bristol871(simulator.serial_port, host, telnet_port=port)
+
+    latencies = np.empty(queries)
+    for k in range(queries):
+        t = time.perf_counter()
+        b.query(":SYST:ERR?")
+        latencies[k] = time.perf_counter() - t
+    print(f"Query latency: median {np.median(latencies) * 1e3:.3f} ms, "
+          f"p99 {np.percentile(latencies, 99) * 1e3:.3f} ms over {queries} queries")
+
+    b.buffer_control('INIT')
+    b.buffer_control('OPEN')
+    t = time.perf_counter()
+    data = b.fetch_buffer()
+    elapsed = time.perf_counter() - t
+    print(f"MMEM dump: {len(data)} records, {data.nbytes / 1e6:.1f} MB in {elapsed:.3f} s "
+          f"({data.nbytes / 1e6 / elapsed:.1f} MB/s)")
+
+    b.start_stream()
+    time.sleep(stream_time)
+    b.stop_stream()
+    decoder = b.stream_decoder
+    print(f"RS-422 stream: {decoder.decoded_frames} frames decoded in {stream_time} s at {simulator.frame_rate} Hz, "
+          f"{decoder.dropped_frames} dropped, {decoder.corrupt_frames} corrupt "
+          f"(simulator dropped {simulator.frames_dropped})")
+    del b
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated Bristol 871A (SCPI over TCP, RS-422 over a pty).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2323)
+    parser.add_argument("--frame-rate", type=int, default=1000)
+    parser.add_argument("--mmem-samples", type=int, default=None, help="fixed number of records returned by :MMEM:DATA?")
+    parser.add_argument("--drop", type=float, default=0.0, help="probability of dropping an RS-422 frame")
+    parser.add_argument("--jitter", type=float, default=0.0, help="RS-422 frame timing jitter [s]")
+    parser.add_argument("--benchmark", action="store_true", help="run the throughput and latency benchmark and exit")
+    args = parser.parse_args()
+
+    with SimulatedBristol871(args.host, args.port, args.frame_rate, args.mmem_samples, args.drop, args.jitter) as sim:
+        print(f"SCPI server on {sim.address[0]}:{sim.address[1]}, RS-422 on {sim.serial_port}")
+        if args.benchmark:
+            run_benchmark(sim)
+        else:
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
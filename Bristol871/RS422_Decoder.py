@@ -0,0 +1,190 @@
+# Bristol 871 RS-422 stream decoder
+#
+# The instrument sends every measurement as a START token (0x7E) followed by a
+# 20-byte "<dfII" record (wavelength, power, status, scan index). Any 0x7E or
+# 0x7D byte inside the record is sent as ESCAPE (0x7D) followed by the byte
+# XOR 0x20. This module decodes that stream in bulk with NumPy instead of one
+# byte at a time.
+
+import numpy as np
+
+START_TOKEN = 0x7E
+ESCAPE_TOKEN = 0x7D
+ESCAPE_XOR = 0x20
+RECORD_DTYPE = np.dtype([("wavelength", "<f8"), ("power", "<f4"),
+                         ("status", "<u4"), ("scan_index", "<u4")])  # One 20-byte "<dfII" record
+MAX_FRAME_BYTES = 1 + 2 * RECORD_DTYPE.itemsize                     # START token plus a fully escaped record
+
+
+class RS422Decoder(object):
+    """Incremental decoder for the escaped, 0x7E-framed RS-422 measurement stream.
+
+    Attributes:
+        corrupt_frames (int): Frames discarded because their unescaped length was not 20 bytes.
+        dropped_frames (int): Frames missing from the stream, counted from gaps in the scan index.
+        decoded_frames (int): Frames successfully decoded so far.
+    """
+
+    def __init__(self):
+        self._carry = b""
+        self._last_scan_index = None
+        self.corrupt_frames = 0
+        self.dropped_frames = 0
+        self.decoded_frames = 0
+
+    def reset(self):
+        """Discards any partial frame and clears the counters."""
+        self.__init__()
+
+    def feed(self, chunk) -> np.ndarray:
+        """Decodes a chunk of raw bytes.
+
+        Args:
+            chunk: Bytes read from the serial port, of any length.
+
+        Returns:
+            A structured array (RECORD_DTYPE) of all frames completed by this
+            chunk. A trailing partial frame is kept for the next call.
+        """
+        data = np.frombuffer(self._carry + bytes(chunk), dtype=np.uint8)
+        starts = np.flatnonzero(data == START_TOKEN)
+        if not len(starts):
+            self._carry = b""                                                   # No frame started yet, discard
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+        body = data[starts[0]:]
+        is_start = body == START_TOKEN
+        frame_id = np.cumsum(is_start) - 1
+        is_escape = body == ESCAPE_TOKEN
+        escaped = np.zeros_like(is_escape)
+        escaped[1:] = is_escape[:-1]
+        keep = ~is_escape & ~is_start
+        values = body[keep] ^ (escaped[keep].astype(np.uint8) * ESCAPE_XOR)
+        kept_ids = frame_id[keep]
+        lengths = np.bincount(kept_ids, minlength=len(starts))
+
+        # The last frame is complete only if it already holds a full record
+        last_complete = lengths[-1] == RECORD_DTYPE.itemsize and not is_escape[-1]
+        if last_complete or len(body) - (starts[-1] - starts[0]) > MAX_FRAME_BYTES:
+            self._carry = b""
+            closed = len(starts)
+        else:
+            self._carry = body[starts[-1] - starts[0]:].tobytes()
+            closed = len(starts) - 1
+
+        valid = lengths[:closed] == RECORD_DTYPE.itemsize
+        self.corrupt_frames += int(closed - np.count_nonzero(valid))
+        valid_bytes = np.zeros(len(starts), dtype=bool)
+        valid_bytes[:closed] = valid
+        records = values[valid_bytes[kept_ids]].view(RECORD_DTYPE)
+
+        if len(records):
+            scan_index = records["scan_index"].astype(np.int64)
+            if self._last_scan_index is not None:
+                scan_index = np.concatenate(([self._last_scan_index], scan_index))
+            steps = np.diff(scan_index) % 2**32                               # The 32-bit scan index wraps
+            forward = (steps > 1) & (steps < 2**31)                             # Larger steps went backwards
+            self.dropped_frames += int(np.sum(steps[forward] - 1))
+            self._last_scan_index = int(scan_index[-1])
+            self.decoded_frames += len(records)
+
+        return records
+
+    def stream(self, serial_port):
+        """Reads the serial port in bulk and yields decoded batches.
+
+        Each read takes everything waiting in the input buffer (at least one
+        byte, which blocks up to the port timeout), so the batch size follows
+        the data rate instead of the frame size.
+
+        Args:
+            serial_port: An open serial.Serial instance.
+
+        Yields:
+            Non-empty structured arrays (RECORD_DTYPE) of decoded records.
+        """
+        while True:
+            chunk = serial_port.read(max(serial_port.in_waiting, 1))
+            if not chunk:
+                continue
+            records = self.feed(chunk)
+            if len(records):
+                yield records
+
+
+class RecordRingBuffer(object):
+    """Fixed-size ring buffer of decoded records for one writer and any number of readers.
+
+    The writer never blocks and never takes a lock. Readers copy out what they
+    need and then check, from the write counters, whether the writer has
+    lapped them during the copy; overwritten records are dropped from the
+    result instead of being returned half-updated.
+
+    Attributes:
+        capacity (int): Number of records held before the oldest are overwritten.
+    """
+
+    def __init__(self, capacity: int, dtype=RECORD_DTYPE):
+        self.capacity = int(capacity)
+        self._data = np.zeros(self.capacity, dtype=dtype)
+        self._head = 0                                                          # Records published so far
+        self._reserved = 0                                                      # Records published or being written
+
+    @property
+    def total(self) -> int:
+        """Number of records written since creation."""
+        return self._head
+
+    def write(self, records: np.ndarray) -> None:
+        """Appends records, overwriting the oldest ones when full."""
+        n = len(records)
+        if not n:
+            return
+        head = self._head
+        if n > self.capacity:
+            records = records[-self.capacity:]
+        self._reserved = head + n
+        start = (head + n - len(records)) % self.capacity
+        first = min(len(records), self.capacity - start)
+        self._data[start:start + first] = records[:first]
+        self._data[:len(records) - first] = records[first:]
+        self._head = head + n
+
+    def _copy(self, begin: int, end: int):
+        """Copies records [begin, end) and returns them with the number lost to overwriting."""
+        begin = max(begin, end - self.capacity, 0)
+        start, stop = begin % self.capacity, (end - 1) % self.capacity + 1
+        if end <= begin:
+            out = self._data[:0].copy()
+        elif start < stop:
+            out = self._data[start:stop].copy()
+        else:
+            out = np.concatenate((self._data[start:], self._data[:stop]))
+        overwritten = max(0, min(self._reserved - self.capacity - begin, len(out)))
+        return out[overwritten:], begin + overwritten
+
+    def snapshot(self, n: int = None) -> np.ndarray:
+        """Returns a copy of the most recent n records (all buffered records by default)."""
+        head = self._head
+        n = self.capacity if n is None else n
+        out, _ = self._copy(head - n, head)
+        return out
+
+    def read_since(self, index: int):
+        """Returns records written since a previous read.
+
+        Args:
+            index: The index returned by the previous call (0 for the first call).
+
+        Returns:
+            A tuple (records, next_index, lost) where lost counts records that
+            were overwritten before they could be read.
+        """
+        head = self._head
+        out, first = self._copy(index, head)
+        return out, head, first - index
+
+    def latest(self):
+        """Returns the most recent record, or None if nothing was written yet."""
+        out = self.snapshot(1)
+        return out[0] if len(out) else None
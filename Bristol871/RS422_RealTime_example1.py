@@ -6,6 +6,7 @@
 from serial import Serial
 from struct import unpack
 import numpy as np
+from RS422_Decoder import RS422Decoder
 
 class Bristol871(object):
 	"""Class representing a Bristol 871 device.
@@ -31,6 +32,7 @@ class Bristol871(object):
 
 		"""
 		self.serial_port = Serial(port=port_number, baudrate=921600, timeout=5)
+		self.decoder = RS422Decoder()
 
 	def __del__(self):
 		"""Closes the connection to the instrument."""
@@ -67,3 +69,17 @@ class Bristol871(object):
 				bytes_received.append(byte)
 
 		return unpack('<dfII', bytes_received)
+
+	def get_measurements(self):
+		"""Reads measurements from the instrument in batches.
+
+		Everything waiting in the serial input buffer is read at once and
+		decoded with RS422Decoder, which keeps up with the 1000 Hz frame rate.
+		Dropped and corrupt frames are counted in self.decoder.
+
+		Yields:
+			Structured NumPy arrays with the fields wavelength, power, status
+			and scan_index.
+
+		"""
+		return self.decoder.stream(self.serial_port)
@@ -35,12 +35,17 @@ print('Connected to the instrument')
 
 with open(output_file, 'w') as log:
 	measurements = 0
-	while measurements < 300:
-		wavelength, power, status, scan_index = device.get_measurement()
-		log.write('{},{},{:f},{:3f}\n'.format(scan_index, status, wavelength, power))
-
-		measurements += 1
-		if measurements % 100 == 0:
+	for batch in device.get_measurements():
+		batch = batch[:300 - measurements]
+		for wavelength, power, status, scan_index in batch.tolist():
+			log.write('{},{},{:f},{:3f}\n'.format(scan_index, status, wavelength, power))
+
+		previous = measurements
+		measurements += len(batch)
+		if measurements // 100 > previous // 100:
 			print('Read {} measurements'.format(measurements))
+		if measurements >= 300:
+			break
 
+print('Dropped frames: {}, corrupt frames: {}'.format(device.decoder.dropped_frames, device.decoder.corrupt_frames))
 print('Done.')
@@ -0,0 +1,289 @@
+# Bristol SCPI transport
+#
+# The Bristol instruments serve SCPI on Telnet port 23. telnetlib was removed in
+# Python 3.13, so this module talks to that port with asyncio streams instead.
+# AsyncSCPIClient is the awaitable interface; TelnetTransport wraps it in a
+# synchronous facade with the subset of the telnetlib.Telnet API used in this
+# package, so existing callers keep working.
+
+import asyncio
+import threading
+
+IAC, DONT, DO, WONT, WILL = 255, 254, 253, 252, 251
+READ_SIZE = 65536
+
+
+class AsyncSCPIClient(object):
+    """asyncio client for the SCPI dialect served on the instrument's Telnet port.
+
+    Line reads strip Telnet option negotiation (and refuse every option, as
+    telnetlib does). Block reads are raw: binary data is passed through as is.
+
+    Attributes:
+        host (str): Device IP address.
+        port (int): TCP port, 23 for the Bristol instruments.
+    """
+
+    def __init__(self, host: str, port: int = 23):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self._buffer = bytearray()                                              # Received but not yet consumed
+        self._lock = None
+
+    async def connect(self, timeout: float = 10) -> None:
+        """Opens the TCP connection."""
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout)
+        self._lock = asyncio.Lock()                                             # Created on the loop that uses it
+
+    async def close(self) -> None:
+        """Closes the TCP connection."""
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self.writer = None
+
+    async def _fill(self, timeout: float = None) -> int:
+        """Waits for more data and appends it to the receive buffer."""
+        data = await asyncio.wait_for(self.reader.read(READ_SIZE), timeout)
+        if not data:
+            raise ConnectionError("Connection closed by the instrument.")
+        self._buffer += data
+        return len(data)
+
+    def _consume(self, n: int) -> bytes:
+        """Removes and returns the first n buffered bytes."""
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        return data
+
+    def _strip_negotiation(self, data: bytes) -> bytes:
+        """Removes Telnet commands from text data and refuses any requested option."""
+        if IAC not in data:
+            return data
+        out, i = bytearray(), 0
+        while i < len(data):
+            if data[i] != IAC:
+                out.append(data[i])
+                i += 1
+            elif i + 1 < len(data) and data[i + 1] == IAC:
+                out.append(IAC)
+                i += 2
+            elif i + 2 < len(data) and data[i + 1] in (DO, DONT, WILL, WONT):
+                if data[i + 1] in (DO, WILL):
+                    self.writer.write(bytes([IAC, WONT if data[i + 1] == DO else DONT, data[i + 2]]))
+                i += 3
+            else:
+                i += 2
+        return bytes(out)
+
+    async def write(self, data: bytes) -> None:
+        """Sends raw bytes."""
+        self.writer.write(data)
+        await self.writer.drain()
+
+    async def read_until(self, expected: bytes = b"\n", timeout: float = None) -> bytes:
+        """
+        Reads until `expected` is found and returns everything up to and including it.
+        Like telnetlib, returns whatever was received (possibly b"") on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            index = self._buffer.find(expected)
+            if index >= 0:
+                return self._strip_negotiation(self._consume(index + len(expected)))
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return self._strip_negotiation(self._consume(len(self._buffer)))
+            try:
+                await self._fill(remaining)
+            except asyncio.TimeoutError:
+                return self._strip_negotiation(self._consume(len(self._buffer)))
+
+    async def readline(self, timeout: float = 3) -> str:
+        """Reads one line and returns it decoded and stripped ("" on timeout)."""
+        return (await self.read_until(b"\n", timeout)).decode("utf-8").strip()
+
+    async def query(self, message: str, timeout: float = 3) -> str:
+        """Sends a query and returns its reply line."""
+        async with self._lock:
+            await self.write(f"{message}\r\n".encode("utf-8"))
+            return await self.readline(timeout)
+
+    async def read_some(self, timeout: float = None) -> bytes:
+        """Returns buffered data, waiting for at least one byte if none is buffered."""
+        if not self._buffer:
+            await self._fill(timeout)
+        return self._consume(len(self._buffer))
+
+    async def drain(self, quiet: float = 0.1, max_time: float = 2) -> bytes:
+        """
+        Discards unsolicited input (e.g. the connection banner) until nothing has
+        arrived for `quiet` seconds, or `max_time` has passed. Returns the discarded text.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_time
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await self._fill(min(quiet, remaining))
+            except asyncio.TimeoutError:
+                break
+        return self._strip_negotiation(self._consume(len(self._buffer)))
+
+    async def read_into(self, view: memoryview, timeout: float = 3) -> None:
+        """
+        Fills `view` with raw bytes. `timeout` applies to each wait for data, so long
+        transfers only fail if the instrument stalls.
+        """
+        pos = min(len(self._buffer), len(view))
+        view[:pos] = self._buffer[:pos]
+        del self._buffer[:pos]
+        while pos < len(view):
+            data = await asyncio.wait_for(self.reader.read(min(READ_SIZE, len(view) - pos)), timeout)
+            if not data:
+                raise ConnectionError(f"Connection closed after {pos} of {len(view)} bytes.")
+            view[pos:pos + len(data)] = data
+            pos += len(data)
+
+    async def read_block_header(self, timeout: float = 3) -> int:
+        """Reads an IEEE-488.2 definite-length block header (#<n><length>) and returns the length."""
+        byte = bytearray(1)
+        for _ in range(16):                                                     # Skip leftover line terminators
+            await self.read_into(memoryview(byte), timeout)
+            if byte == b"#":
+                break
+        else:
+            raise ValueError("Block header '#' not found.")
+
+        await self.read_into(memoryview(byte), timeout)
+        if not b"1" <= byte <= b"9":
+            raise ValueError(f"Invalid block header length digit: {bytes(byte)!r}")
+
+        length_digits = bytearray(int(byte))
+        await self.read_into(memoryview(length_digits), timeout)
+        return int(length_digits)
+
+    async def read_block(self, timeout: float = 3) -> bytearray:
+        """Reads a definite-length block into one preallocated bytearray and returns the data."""
+        block = bytearray(await self.read_block_header(timeout))
+        await self.read_into(memoryview(block), timeout)
+        return block
+
+    async def query_block(self, *commands: str, timeout: float = 3) -> bytearray:
+        """Sends commands, the last of which returns a definite-length block, and reads the block."""
+        async with self._lock:
+            await self.write("".join(f"{command}\r\n" for command in commands).encode("utf-8"))
+            return await self.read_block(timeout)
+
+    async def iter_block(self, chunk_size: int = READ_SIZE, timeout: float = 3):
+        """Reads a definite-length block and yields its data in chunks as they arrive."""
+        remaining = await self.read_block_header(timeout)
+        while remaining:
+            chunk = bytearray(min(chunk_size, remaining))
+            await self.read_into(memoryview(chunk), timeout)
+            remaining -= len(chunk)
+            yield chunk
+
+
+class TelnetTransport(object):
+    """Synchronous facade over AsyncSCPIClient, compatible with the telnetlib.Telnet calls used here.
+
+    The client runs on an event loop in a background thread, or on `loop` if
+    one is given (it must already be running in another thread). Coroutines of
+    self.client can be awaited from any event loop through awaitable().
+
+    Attributes:
+        client (AsyncSCPIClient): The underlying asyncio client.
+        loop: Event loop the client runs on.
+    """
+
+    def __init__(self, host: str, port: int = 23, timeout: float = 10, loop=None):
+        self._own_loop = loop is None
+        if self._own_loop:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name=f"SCPI-{host}", daemon=True).start()
+        self.loop = loop
+        self.client = AsyncSCPIClient(host, port)
+        self._closed = False
+        try:
+            self._run(self.client.connect(timeout))
+        except Exception:
+            self._stop_loop()
+            raise
+
+    def _run(self, coro):
+        """Runs a client coroutine on the transport loop and waits for its result."""
+        if self._closed or not self.loop.is_running():
+            coro.close()
+            raise ConnectionError("Transport is closed.")
+        try:
+            return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+        except asyncio.TimeoutError as e:                                       # Distinct from TimeoutError before 3.11
+            raise TimeoutError(str(e) or "Read timed out.") from e
+
+    def _stop_loop(self):
+        if self._own_loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def awaitable(self, coro):
+        """Returns an awaitable for a client coroutine that can be awaited from any event loop."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            return coro
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def write(self, buffer: bytes) -> None:
+        self._run(self.client.write(buffer))
+
+    def query(self, message: str, timeout: float = 3) -> str:
+        """Sends a query and reads its reply line while holding the client lock, like aquery()."""
+        return self._run(self.client.query(message, timeout))
+
+    def query_block(self, *commands: str, timeout: float = 3) -> bytearray:
+        """Sends commands and reads the definite-length block returned by the last, holding the client lock."""
+        return self._run(self.client.query_block(*commands, timeout=timeout))
+
+    def read_until(self, expected: bytes, timeout: float = None) -> bytes:
+        return self._run(self.client.read_until(expected, timeout))
+
+    def read_some(self) -> bytes:
+        return self._run(self.client.read_some())
+
+    def drain(self, quiet: float = 0.1, max_time: float = 2) -> bytes:
+        return self._run(self.client.drain(quiet, max_time))
+
+    def rawq_getchar(self, timeout: float = 3) -> bytes:
+        byte = bytearray(1)
+        self._run(self.client.read_into(memoryview(byte), timeout))
+        return bytes(byte)
+
+    def read_into(self, view: memoryview, timeout: float = 3) -> None:
+        self._run(self.client.read_into(view, timeout))
+
+    def read_block(self, timeout: float = 3) -> bytearray:
+        return self._run(self.client.read_block(timeout))
+
+    def set_debuglevel(self, level: int) -> None:
+        """Kept for telnetlib compatibility; there is no debug output."""
+
+    def close(self) -> None:
+        """Closes the connection and stops the transport's own loop. Further calls do nothing."""
+        if self._closed:
+            return
+        try:
+            if self.loop.is_running():
+                self._run(self.client.close())
+        finally:
+            self._closed = True
+            self._stop_loop()
@@ -2,9 +2,9 @@
 # This module contains functions to call SCPI commands to collect data from the instrument.
 # This is the class utilized by the example @ref scpi_example.py.
 
-import telnetlib
 import time
 from struct import unpack
+from Bristol871.SCPI_Transport import TelnetTransport
 
 try:
     import numpy as np
@@ -16,13 +16,13 @@ except Exception as e:
 #
 class pyBristolSCPI:
 
-    ## Constructor establishes a connection with the device using telnetlib and turns off the debugging messages.
+    ## Constructor establishes a connection with the device over Telnet port 23 and turns off the debugging messages.
     # @param host - ip address assigned to the instrument
     def __init__(self, host='10.199.199.1'):
         #'10.199.199.1' #USB connection
         try:
             ## Handle to the telnet connection.
-            self.tn = telnetlib.Telnet(host)
+            self.tn = TelnetTransport(host)
             self.tn.set_debuglevel(0) #turn off debug messages printed to console
             #there's an opening message that you will want to skip over
             self.skipOpeningMessage(0.5) 
@@ -5,9 +5,11 @@
 # common to our instruments, and some special functions that are instrument specific.
 # The instrument specific examples have been commented out. Simply uncomment them to run.
 #
+# Run from the repository root: python -m Bristol871.scpi_example
+#
 # Example:
 
-from pyBristolSCPI import *
+from Bristol871.pyBristolSCPI import *
 import time
 
 def run_example():
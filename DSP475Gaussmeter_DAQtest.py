@@ -3,6 +3,7 @@ from time import time, perf_counter, sleep, strftime, localtime
 import struct
 import nidaqmx.system, nidaqmx.system.storage
 from Lakeshore475DSPGaussmeter.Lakeshore475 import LakeShore475
+from Timing.Deadline_Scheduler import DeadlineScheduler
 
 gpib_address = "GPIB1::11::INSTR"
 gaussmeter = LakeShore475(gpib_address)
@@ -17,25 +18,19 @@ K_vapor = os.path.join(dir_path, 'K_vapor_cell')
 Gaussmeter_path = os.path.join(K_vapor, 'Gaussmeter_data')
 
 def measure():
-    i = 0
     timestamps, fields, temps = [], [], []
     print("\n=============== Measurement Initiated ===============")
     start_time = time()
-    while i < trigger_NPeriods:
-        if i == 0:
-            t0 = perf_counter()
-        while perf_counter() - t0 < trigger_times[i]:
-            pass
+    ticks = DeadlineScheduler(trigger_times)
+    t0 = perf_counter()
+    for i in ticks.run(t0):
         fields.append(gaussmeter.field)
         temps.append(gaussmeter.temperature)
-        t1 = perf_counter()
-        while perf_counter() - t1 < (trigger_period/2):
-            pass
-        i = i + 1
-        print(f"\rTime remaining:          {int(MeasureDuration-i*trigger_period):4d}", 's', end='')
+        print(f"\rTime remaining:          {int(MeasureDuration-(i+1)*trigger_period):4d}", 's', end='')
     sleep(trigger_period / 2) 
     elap_time = perf_counter() - t0
     print("\n=============== Measurement Completed ===============")
+    ticks.report("Gaussmeter loop")
     timestamp = [start_time + time for time in trigger_times]
     for j in range(trigger_NPeriods):
         formatted_timestamp = strftime("%Y-%m-%dT%H:%M:%S.", localtime(timestamp[j])) + f"{timestamp[j] % 1:.3f}".split(".")[1]
@@ -114,32 +109,30 @@ def test_lakeshore_475():
         print("\n=== Checking Field Setpoint ===")
         print(f"The current setpoint is: {gaussmeter.setpoint}")
         
-        # # Start logging
-        # print("\n=== Starting Data Logging for 1 Seconds ===")
-        # gaussmeter.data_log(True)
-        # sleep(MeasureDuration)
-        # gaussmeter.data_log(False)
-        # print("Data logging stopped.")
-
-        # # Get the number of points stored
-        # print("\n=== Checking Data Buffer Size ===")
-        # num_points = gaussmeter.data_log_num_points()
-        # print(f"Data Points in Buffer: {num_points}")
-
-        # # Retrieve and print data
-        # print("\n=== Retrieving Logged Data ===")
-        # logged_data = gaussmeter.get_log_data(num_points=10)
-        # print(f"Logged Data: {logged_data}")
+        # Log with the internal datalogger; it is read out in the background
+        print("\n=== Logging Data at 1000 Hz for 1 Second ===")
+        gaussmeter.record_log(MeasureDuration, rate=1000)
+        log_times, logged_data = gaussmeter.log_data()
+        print(f"Data Points in Buffer: {len(logged_data)}")
+        print(f"Logged Data: {logged_data}")
+
+        # Separate field/temperature queries against the single-transaction read
+        print("\n=== Benchmarking Field and Temperature Reads ===")
+        gaussmeter.benchmark_reads(n=100)
 
         # Testing high-speed binary output
-        """
-        The returned results is repetitive and not refreshing,
-        the instrument seemed to be frozen after the command was sent.
-        """
-        # print("\n=== Testing High-Speed Binary Data Retrieval ===")
-        # fast_data = gaussmeter.read_fast_data(num_readings=10)
-        # gaussmeter.data_log(False)
-        # print(f"Fast Data: {fast_data}")
+        print("\n=== Testing High-Speed Binary Data Retrieval ===")
+        fast_data = gaussmeter.read_fast_data(num_readings=10)
+        print(f"Fast Data: {fast_data}")
+
+        print("\n=== Streaming High-Speed Data for 1 Second ===")
+        gaussmeter.start_fast_stream(chunk_readings=100)
+        sleep(MeasureDuration)
+        gaussmeter.stop_fast_stream()
+        print(f"Fast Data: {len(gaussmeter.fast_data)} readings in {len(gaussmeter.fast_chunks)} transfers")
+        gaps = gaussmeter.fast_gaps
+        if len(gaps) > 1:
+            print(f"Gaps between transfers: mean {gaps[1:].mean() * 1e3:.1f} ms, max {gaps.max() * 1e3:.1f} ms")
 
         print("\n=== Test Completed Successfully ===")
 
@@ -0,0 +1,226 @@
+# DSP 7265 binary curve dump
+#
+# pymeasure reads the curve buffer with the ASCII dump command (DC), one text
+# value per point. The 7265 can also dump a curve in binary (DCB): two bytes
+# per point, MSB first, as signed integers. DSP7265Binary reads curves that way
+# straight into NumPy arrays and scales them vectorized. If the binary dump
+# fails, it switches to the ASCII path for the rest of the session.
+#
+# configure() applies a lock-in settings dict by writing only what differs from
+# the cached settings. The cache is kept per VISA resource for the whole process,
+# so lock-ins rebuilt for the next run start warm. On a cold cache the current
+# state is read in one compound query (the 7265 accepts several commands on a
+# line, separated by ';') and only the settings that differ are written.
+
+import math
+import threading
+import numpy as np
+from pymeasure.instruments.signalrecovery import DSP7265
+
+BINARY_CURVES = {"x": 0, "y": 1, "magnitude": 2, "phase": 3}   # Curve buffer bit of each quantity with a binary path
+FULL_SCALE = 10000                                              # Integer value of a full-scale X, Y or magnitude point
+PHASE_SCALE = 100                                               # Phase points are in hundredths of a degree
+SETTINGS = {"harmonic": "harmonic", "phase": "reference_phase", "gain": "gain", "sens": "sensitivity",
+            "TC": "time_constant", "coupling": "coupling", "vmode": "vmode", "imode": "imode", "fet": "fet",
+            "shield": "shield", "reference": "reference", "slope": "slope",
+            "trigger_mode": "curve_buffer_triggered"}           # lockin_settings key: DSP7265 property, in write order
+SETTING_QUERIES = {"harmonic": "REFN", "phase": "REFP.", "gain": "ACGAIN", "sens": "SEN.", "TC": "TC",
+                   "coupling": "CP", "vmode": "VMODE", "imode": "IMODE", "fet": "FET", "shield": "FLOAT",
+                   "reference": "IE", "slope": "SLOPE"}          # Query command of each setting that can be read back
+_SETTINGS_CACHE = {}                                            # Cached settings by VISA resource, shared by all instances
+
+
+class DSP7265Binary(DSP7265):
+    """DSP7265 whose curve buffer is transferred with the binary dump command.
+
+    get_buffer() and buffer_to_float() keep the pymeasure signatures, so callers
+    do not change: raw buffers are dicts of int16 arrays and converted buffers
+    dicts of float64 arrays. configure() applies settings incrementally.
+
+    Attributes:
+        binary_curves (bool): False once a binary dump has failed; ASCII is used from then on.
+    """
+
+    def __init__(self, adapter, name="Signal Recovery DSP 7265", **kwargs):
+        super().__init__(adapter, name, **kwargs)
+        self.binary_curves = True
+        resource = getattr(getattr(self.adapter, "connection", None), "resource_name", None)
+        resource = resource if isinstance(resource, str) else name
+        self._settings = _SETTINGS_CACHE.setdefault(resource, {})             # Last known state, by lockin_settings key
+        self._replies = threading.local()                                       # Replies replayed to the property getters
+
+    def ask(self, command, query_delay=None):
+        """Answers from the replies of a compound query while read_settings() converts them."""
+        replies = getattr(self._replies, "replies", None)
+        if replies is not None and command in replies:
+            return replies[command]
+        return super().ask(command, query_delay)
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # Configuration
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    @staticmethod
+    def _same(actual, wanted) -> bool:
+        """Compares a read-back setting with the wanted one, allowing for instrument rounding of numbers."""
+        numbers = (int, float)
+        if isinstance(actual, numbers) and isinstance(wanted, numbers) and not isinstance(wanted, bool):
+            return math.isclose(actual, wanted, rel_tol=1e-3, abs_tol=1e-12)
+        return actual == wanted
+
+    def _compound_query(self, commands: list) -> dict:
+        """Sends the queries on one line and returns {command: reply}."""
+        values = self.ask(";".join(commands)).strip().split(",")
+        while len(values) < len(commands):                                      # Replies may also come one per line
+            values += self.read().strip().split(",")
+        if len(values) != len(commands):
+            raise ValueError(f"Expected {len(commands)} replies, got {len(values)}: {values}")
+        return dict(zip(commands, (value.strip() for value in values)))
+
+    def read_settings(self, keys=SETTINGS) -> dict:
+        """
+        Reads the given settings (lockin_settings keys); unreadable ones are left out. Settings
+        in SETTING_QUERIES are read with one compound query and converted by the pymeasure
+        properties; the others, or all of them if the compound query fails, one query each.
+        """
+        keys, state = list(keys), {}
+        batched = [SETTING_QUERIES[key] for key in keys if key in SETTING_QUERIES]
+        if len(batched) > 1:
+            try:
+                self._replies.replies = self._compound_query(batched)
+            except Exception as e:
+                print(f"{self.name}: compound settings query failed ({e}), reading one by one.")
+                self._clear()
+        try:
+            for key in keys:
+                try:
+                    state[key] = int(self.ask("VMODE")) if key == "vmode" else getattr(self, SETTINGS[key])
+                except Exception as e:
+                    print(f"{self.name}: could not read {key} ({e}), it will be written.")
+        finally:
+            self._replies.replies = None
+        return state
+
+    def _write_setting(self, key: str, value) -> None:
+        """Writes one setting and stores it in the cache."""
+        if key == "vmode":
+            self.vmode(value)
+        else:
+            setattr(self, SETTINGS[key], value)
+        self._settings[key] = value
+
+    def configure(self, settings: dict, read_back: bool = True) -> dict:
+        """
+        Applies a lockin_settings entry, writing only the settings that differ from the cache.
+        Settings not yet cached are first read from the instrument in one compound query
+        (read_settings) and only written if they differ; with read_back False they are
+        written without reading.
+
+        Returns:
+            The settings that were written, as {key: (previous value, new value)};
+            the previous value is None when it was not known.
+        """
+        wanted = {key: settings[key] for key in SETTINGS if key in settings}
+        if read_back:
+            self._settings.update(self.read_settings([key for key in wanted if key not in self._settings]))
+        changes = {key: (self._settings.get(key), value) for key, value in wanted.items()
+                   if key not in self._settings or not self._same(self._settings[key], value)}
+        for key, (_, value) in changes.items():
+            self._write_setting(key, value)
+        return changes
+
+    def invalidate_settings(self, *keys: str) -> None:
+        """Clears the given cached settings, or the whole cache if none are given."""
+        if not keys:
+            self._settings.clear()
+        for key in keys:
+            self._settings.pop(key, None)
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # Curve buffer
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _points_acquired(self) -> int:
+        """Number of points in the curve buffer, from the M? status reply."""
+        return int(self.values("M")[3])
+
+    def _dump_curve(self, quantity: str, points: int) -> np.ndarray:
+        """Reads one curve with DCB and returns it as int16."""
+        self.write(f"DCB {BINARY_CURVES[quantity]}")                          # Curve bit number, as for DC
+        data = self.read_bytes(2 * points)
+        if len(data) != 2 * points:
+            raise ValueError(f"Binary dump of {quantity} returned {len(data)} bytes, expected {2 * points}.")
+        return np.frombuffer(data, dtype=">i2").astype(np.int16)
+
+    def _ascii_curve(self, quantity: str, points: int) -> np.ndarray:
+        """Reads one curve with DC, one value per line, and returns it as int16."""
+        self.write(f"DC {BINARY_CURVES[quantity]}")
+        return np.array([int(self.read().strip()) for _ in range(points)], dtype=np.int16)
+
+    def dump_buffer(self, quantities=("x", "y")) -> dict:
+        """
+        Returns the raw curves in the buffer whatever its acquisition status, e.g. halted
+        between segments, where pymeasure's get_buffer refuses to read without waiting.
+        Reads in binary, or with DC once the binary dump has failed.
+        """
+        points = self._points_acquired()
+        if not points:
+            return {q: np.zeros(0, dtype=np.int16) for q in quantities}
+        if self.binary_curves:
+            try:
+                return {q: self._dump_curve(q, points) for q in quantities}
+            except Exception as e:
+                print(f"{self.name}: binary curve dump unavailable ({e}), using ASCII.")
+                self.binary_curves = False
+                self._clear()
+        return {q: self._ascii_curve(q, points) for q in quantities}
+
+    def _clear(self):
+        """Discards a partly read binary dump."""
+        connection = getattr(self.adapter, "connection", None)
+        if connection is not None:
+            connection.clear()
+
+    def get_buffer(self, quantity=None, convert_to_float=True, wait_for_buffer=True):
+        """
+        Returns the curve buffer, read in binary when every requested quantity has a binary
+        path, otherwise with pymeasure's ASCII dump. Like pymeasure, a single named quantity
+        returns its array, anything else a dict of arrays.
+        """
+        quantities = self.curve_buffer_bits if quantity is None else quantity
+        if isinstance(quantities, int):                                         # Raw CMS bit mask
+            quantities = [q for q, bit in BINARY_CURVES.items() if quantities >> bit & 1] if quantities < 16 else ["?"]
+        quantities = [quantities] if isinstance(quantities, str) else list(quantities)
+        if not self.binary_curves or not all(q in BINARY_CURVES for q in quantities):
+            return super().get_buffer(quantity=quantity, convert_to_float=convert_to_float, wait_for_buffer=wait_for_buffer)
+
+        if wait_for_buffer:
+            self.wait_for_buffer()
+        try:
+            points = self._points_acquired()
+            buffer = {q: self._dump_curve(q, points) for q in quantities}
+        except Exception as e:
+            print(f"{self.name}: binary curve dump unavailable ({e}), using ASCII.")
+            self.binary_curves = False
+            self._clear()
+            return super().get_buffer(quantity=quantity, convert_to_float=convert_to_float, wait_for_buffer=False)
+
+        if convert_to_float:
+            buffer = self.buffer_to_float(buffer)
+        return buffer[quantities[0]] if isinstance(quantity, str) else buffer
+
+    def buffer_to_float(self, buffer_data, sensitivity=None, sensitivity2=None, raise_error=True):
+        """
+        Converts a raw buffer to physical units. With a known sensitivity, X, Y, magnitude
+        and phase are scaled as whole arrays; anything else goes to pymeasure's conversion.
+        """
+        if sensitivity is None or not all(key in BINARY_CURVES for key in buffer_data):
+            buffer_data = {key: np.asarray(value) for key, value in buffer_data.items()}      # pymeasure multiplies arrays
+            return super().buffer_to_float(buffer_data, sensitivity=sensitivity, sensitivity2=sensitivity2,
+                                           raise_error=raise_error)
+
+        converted = {}
+        for key, value in buffer_data.items():
+            value = np.asarray(value, dtype=np.float64)
+            converted[key] = value / PHASE_SCALE if key == "phase" else value * (sensitivity / FULL_SCALE)
+        return converted
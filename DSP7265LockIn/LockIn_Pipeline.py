@@ -0,0 +1,157 @@
+# Pipelined lock-in curve buffer retrieval
+#
+# The lock-ins share one GPIB bus, so their buffers can only be transferred one
+# after another. Everything else can overlap: while lock-in N+1 is transferring,
+# a worker thread converts lock-in N to volts and formats its X/Y columns. The
+# output file is written once the last columns are ready, in blocks of rows:
+# every CSV row holds all lock-ins, so no row is complete before the last one.
+# Segments drained during the run (see LockIn_Segments) are stitched in front.
+# The file has one timestamp column if the lock-ins' segment times agree, and
+# one per lock-in if they do not.
+
+import queue
+import threading
+from time import perf_counter
+
+import numpy as np
+
+from Timing.Timestamps import format_timestamps
+
+
+class LockInBufferPipeline(object):
+    """Retrieves DSP7265 curve buffers with transfer overlapping conversion and formatting.
+
+    Attributes:
+        lockins (dict): Lock-in instruments by name, in output column order.
+        settings (dict): Per lock-in settings; "sens" is used to convert the raw buffer.
+        timings (dict): Per-stage times in seconds from the last run().
+    """
+
+    def __init__(self, lockins: dict, settings: dict):
+        self.lockins = lockins
+        self.settings = settings
+        self.timings = {}
+
+    def _transfer(self, name: str, lockin):
+        """Reads one raw curve buffer and its status."""
+        raw = lockin.get_buffer(quantity=None, convert_to_float=False, wait_for_buffer=True)
+        return raw, lockin.curve_buffer_status
+
+    def _convert(self, name: str, lockin, raw):
+        """Converts one raw curve buffer to X and Y in volts."""
+        XY = lockin.buffer_to_float(raw, sensitivity=self.settings[name]["sens"], raise_error=True)
+        return np.asarray(XY["x"], dtype=np.float64), np.asarray(XY["y"], dtype=np.float64)
+
+    def _worker(self, jobs: queue.Queue, columns: dict, segments):
+        """Converts and formats buffers as the transfer stage hands them over."""
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            name, lockin, raw = job
+            start = perf_counter()
+            try:
+                X, Y = self._convert(name, lockin, raw)
+                if segments is not None:
+                    X, Y = segments.stitch(name, X, Y)
+                columns[name] = (X.astype(str), Y.astype(str))
+            except Exception as e:
+                print(f"Error converting data from {name} lock-in: {e}")
+            self.timings["convert"][name] = perf_counter() - start
+
+    @staticmethod
+    def split_time_column(header: str, names: list) -> str:
+        """
+        Rewrites the column line (the last line of header, a time column followed by an X/Y
+        pair per lock-in) for one time column per lock-in: "Timestamp,X_1f,Y_1f" becomes
+        "Timestamp_1f,X_1f,Y_1f".
+        """
+        lines = header.rstrip("\n").split("\n")
+        labels = lines[-1].split(",")
+        lines[-1] = ",".join(f"{labels[0]}_{name},{','.join(labels[1 + 2 * k:3 + 2 * k])}"
+                             for k, name in enumerate(names))
+        return "\n".join(lines) + "\n"
+
+    def run(self, file_path: str, header: str, t0: float, interval: float, chunk_rows: int = 4096,
+            segments=None, reference: str = None) -> dict:
+        """
+        Retrieves every buffer and writes them to one file.
+
+        Args:
+            file_path: Output file.
+            header: Text written before the rows (comment lines and column names).
+            t0: Host time of the first buffer point, in seconds since the epoch.
+            interval: Time between buffer points in seconds.
+            chunk_rows: Rows joined and written per write call.
+            segments: SegmentedLockInAcquisition of the run, if its buffers were drained in segments.
+            reference: Lock-in whose segment times give the timestamp column (the first by default).
+                If another lock-in's segment times differ from it by more than half an interval,
+                one column cannot label both, and every lock-in gets its own timestamp column
+                in front of its X/Y columns (see split_time_column).
+
+        Returns:
+            self.timings: transfer and convert times per lock-in, the write time, the
+            sum of all stages and the wall time of the whole run.
+        """
+        self.timings = {"transfer": {}, "convert": {}}
+        columns = {}
+        segments = segments if segments is not None and segments.segmented else None
+        jobs = queue.Queue()
+        worker = threading.Thread(target=self._worker, args=(jobs, columns, segments), name="LockIn-convert", daemon=True)
+        start = perf_counter()
+        worker.start()
+        try:
+            for name, lockin in self.lockins.items():
+                t = perf_counter()
+                try:
+                    raw, status = self._transfer(name, lockin)
+                    print(f"{name} buffer status: {status}")
+                    jobs.put((name, lockin, raw))
+                except Exception as e:
+                    print(f"Error retrieving data from {name} lock-in: {e}")
+                self.timings["transfer"][name] = perf_counter() - t
+        finally:
+            jobs.put(None)
+            worker.join()
+
+        t = perf_counter()
+        n = min((len(X) for X, _ in columns.values()), default=0)
+        missing = np.full(n, "nan")
+        misaligned = {}
+        if segments is not None:
+            reference = reference or next(iter(self.lockins))
+            times = segments.point_times(reference, t0, n)
+            for name in columns:
+                offset = np.max(np.abs(segments.point_times(name, t0, n) - times), initial=0)
+                if not offset <= self.settings[reference]["interval"] / 2:
+                    misaligned[name] = offset
+        else:
+            times = t0 + np.arange(n) * interval
+        if misaligned:
+            print(f"Warning: segment times of the {', '.join(misaligned)} lock-in(s) differ from those of {reference} "
+                  f"by up to {max(misaligned.values()) * 1e3:.1f} ms; writing one timestamp column per lock-in.")
+            header = self.split_time_column(header, list(self.lockins))
+            table = []
+            for name in self.lockins:
+                X, Y = columns.get(name, (missing, missing))
+                table.extend([format_timestamps(segments.point_times(name, t0, n)), X[:n], Y[:n]])
+        else:
+            table = [format_timestamps(times)]
+            for name in self.lockins:
+                X, Y = columns.get(name, (missing, missing))
+                table.extend([X[:n], Y[:n]])
+        with open(file_path, "w") as log:
+            log.write(header)
+            for begin in range(0, n, chunk_rows):
+                log.write("".join(",".join(row) + "\n" for row in zip(*(column[begin:begin + chunk_rows] for column in table))))
+        self.timings["write"] = perf_counter() - t
+        self.timings["wall"] = perf_counter() - start
+        self.timings["stages"] = (sum(self.timings["transfer"].values()) + sum(self.timings["convert"].values())
+                                  + self.timings["write"])
+
+        print("Lock-in retrieval: " + ", ".join(f"{name} transfer {self.timings['transfer'][name]:.2f} s / "
+                                                f"convert {self.timings['convert'].get(name, 0):.2f} s"
+                                                for name in self.timings["transfer"])
+              + f", write {self.timings['write']:.2f} s; {self.timings['stages']:.2f} s of work in "
+                f"{self.timings['wall']:.2f} s.")
+        return self.timings
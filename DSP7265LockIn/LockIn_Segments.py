@@ -0,0 +1,151 @@
+# Segmented lock-in acquisition
+#
+# A DSP7265 curve buffer holds at most 16384 points. For longer runs a
+# background thread halts every lock-in before its buffer fills, reads all
+# segments out, clears the curve memory (NC) and restarts acquisition (TD) on
+# all of them back to back. The gate stays high for the whole run, so no new
+# trigger edge would restart a triggered buffer; TD starts it explicitly.
+# Halting and restarting all lock-ins together keeps their segment boundaries
+# aligned. The host times of each halt and restart are recorded per lock-in,
+# so the segments can be stitched into one series whose timestamps restart
+# after every gap.
+
+import threading
+from time import perf_counter, time
+
+import numpy as np
+
+
+class SegmentedLockInAcquisition(object):
+    """Drains and re-arms lock-in curve buffers in the background during a run.
+
+    Attributes:
+        lockins (dict): Lock-in instruments by name.
+        settings (dict): Per lock-in settings; "length", "interval" and "sens" are used.
+        segments (dict): Per lock-in list of drained segments (halt and re-arm host
+            times, number of points and the gap in seconds).
+        data (dict): Per lock-in list of drained (X, Y) arrays in volts.
+    """
+
+    def __init__(self, lockins: dict, settings: dict, fill: float = 0.9):
+        self.lockins = lockins
+        self.settings = settings
+        self.fill = fill
+        self.schedule = []
+        self.segments = {name: [] for name in lockins}
+        self.data = {name: [] for name in lockins}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def plan(self, duration: float) -> list:
+        """
+        Returns the elapsed times [s] at which all buffers are drained so that none holds
+        more than `fill` of its length. An empty list means the run fits into the buffers.
+        """
+        segment_time = min(s["length"] * s["interval"] for s in self.settings.values()) * self.fill
+        if duration <= segment_time:
+            return []
+        return [segment_time * (k + 1) for k in range(int(np.ceil(duration / segment_time)) - 1)]
+
+    @property
+    def segmented(self) -> bool:
+        """True if any buffer was drained during the last run."""
+        return any(self.segments.values())
+
+    def start(self, duration: float) -> bool:
+        """
+        Starts draining in the background if the run does not fit into the buffers.
+        Call when the lock-in buffers start acquiring. Returns True if segmented.
+        """
+        self.schedule = self.plan(duration)
+        self.segments = {name: [] for name in self.lockins}
+        self.data = {name: [] for name in self.lockins}
+        if not self.schedule:
+            return False
+        print(f"Lock-in buffers will be drained in {len(self.schedule) + 1} segments.")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._worker, args=(perf_counter(),), name="LockIn-segments", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        """Stops draining. Call before the buffers are halted at the end of the run."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _worker(self, t0: float):
+        """Drains all buffers at each scheduled boundary until stopped."""
+        for boundary in self.schedule:
+            if self._stop.wait(max(t0 + boundary - perf_counter(), 0)):
+                return
+            self.drain()
+
+    def _each(self, action: str, names, call) -> dict:
+        """Calls call(name, lockin) for the given lock-ins; returns the host time after each successful call."""
+        times = {}
+        for name in names:
+            try:
+                call(name, self.lockins[name])
+                times[name] = time()
+            except Exception as e:
+                print(f"Error {action} {name} lock-in buffer: {e}")
+        return times
+
+    def drain(self) -> None:
+        """
+        Halts every buffer, then reads them all out, then clears and restarts them all,
+        so the lock-ins stay on common segment boundaries. Records the segment of each.
+        """
+        raw = {}
+
+        def read(name, lockin):
+            raw[name] = lockin.dump_buffer(("x", "y"))                         # Halted: get_buffer would refuse in ASCII
+
+        halted = self._each("halting", self.lockins, lambda name, lockin: lockin.halt_buffer())
+        self._each("reading", halted, read)
+        cleared = self._each("clearing", raw, lambda name, lockin: lockin.init_curve_buffer())
+        armed = self._each("restarting", cleared, lambda name, lockin: lockin.start_buffer())
+
+        for name in raw:
+            XY = self.lockins[name].buffer_to_float(raw[name], sensitivity=self.settings[name]["sens"], raise_error=True)
+            X, Y = np.asarray(XY["x"], dtype=np.float64), np.asarray(XY["y"], dtype=np.float64)
+            if self.segments[name] and not len(X):
+                print(f"Warning: segment {len(self.segments[name])} of {name} lock-in is empty.")
+            self.data[name].append((X, Y))
+            self.segments[name].append({"segment": len(self.segments[name]), "halted": halted[name],
+                                        "armed": armed.get(name, np.nan), "num_points": len(X),
+                                        "gap": armed.get(name, np.nan) - halted[name]})
+        for name in armed:
+            try:
+                if self.lockins[name].curve_buffer_status[0] != 1:                 # 1: acquisition via TD running
+                    print(f"Warning: {name} lock-in buffer did not restart after segment {len(self.segments[name])}.")
+            except Exception as e:
+                print(f"Error checking {name} lock-in buffer status: {e}")
+
+    def stitch(self, name: str, X: np.ndarray, Y: np.ndarray):
+        """Returns the drained segments of one lock-in followed by its final (X, Y)."""
+        return (np.concatenate([x for x, _ in self.data[name]] + [X]),
+                np.concatenate([y for _, y in self.data[name]] + [Y]))
+
+    def point_times(self, name: str, t0: float, n: int) -> np.ndarray:
+        """
+        Host times of the first n stitched points of one lock-in: each segment starts at
+        its re-arm time (the first at t0) and advances by the lock-in's interval.
+        """
+        interval = self.settings[name]["interval"]
+        starts = [t0] + [seg["armed"] for seg in self.segments[name]]
+        counts = [seg["num_points"] for seg in self.segments[name]]
+        counts.append(max(n - sum(counts), 0))
+        times = np.concatenate([start + np.arange(count) * interval for start, count in zip(starts, counts)])
+        return times[:n]
+
+    def report(self) -> None:
+        """Prints the number of segments and the total gap time per lock-in."""
+        for name, segments in self.segments.items():
+            if segments:
+                gaps = [seg["gap"] for seg in segments]
+                print(f"{name}: {len(segments) + 1} segments, {sum(gaps):.3f} s total gap "
+                      f"(max {max(gaps) * 1e3:.1f} ms).")
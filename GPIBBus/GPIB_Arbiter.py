@@ -0,0 +1,136 @@
+# GPIB bus arbiter
+#
+# The lock-ins and the gaussmeter share one GPIB bus. GPIBArbiter hands out a
+# single ResourceManager for all of them and serializes their transactions.
+# Waiting transactions are granted by priority, so a time-critical gaussmeter
+# read goes ahead of the next chunk of a bulk lock-in transfer. A transaction
+# that already holds the bus is never interrupted.
+
+import contextlib
+import functools
+import threading
+from time import perf_counter
+
+import pyvisa
+
+TIME_CRITICAL = 0                                                               # e.g. gaussmeter field reads
+NORMAL = 1
+BULK = 2                                                                        # e.g. lock-in buffer transfers
+DEFAULT_METHODS = ("write", "read", "ask", "values", "binary_values", "read_bytes", "query")
+
+
+class GPIBArbiter(object):
+    """Serializes transactions on a shared GPIB bus, granting waiting transactions by priority.
+
+    Transactions are reentrant within a thread, so a wrapped method that calls
+    other wrapped methods (e.g. values() calling ask()) holds the bus once.
+
+    Attributes:
+        rm (pyvisa.ResourceManager): Resource manager shared by every instrument on the bus.
+        stats (dict): Per-instrument transaction count and wait/hold times in seconds.
+    """
+
+    def __init__(self, visa_library: str = ""):
+        self.rm = pyvisa.ResourceManager(visa_library)
+        self._cond = threading.Condition()
+        self._owner = None
+        self._depth = 0
+        self._waiting = [0, 0, 0]                                               # Waiting transactions per priority
+        self.stats = {}
+        self._stats_start = perf_counter()
+
+    @property
+    def visa_library(self):
+        """VISA library of the shared resource manager; pass it to pymeasure instruments as visa_library."""
+        return self.rm.visalib
+
+    def open_resource(self, resource_name: str, **kwargs):
+        """Opens a resource with the shared resource manager."""
+        return self.rm.open_resource(resource_name, **kwargs)
+
+    def acquire(self, name: str, priority: int = NORMAL) -> None:
+        """Waits until the bus is free and no higher-priority transaction is waiting, then takes it."""
+        me = threading.get_ident()
+        with self._cond:
+            if self._owner == me:
+                self._depth += 1
+                return
+            requested = perf_counter()
+            self._waiting[priority] += 1
+            try:
+                while self._owner is not None or any(self._waiting[:priority]):
+                    self._cond.wait()
+            finally:
+                self._waiting[priority] -= 1                                    # Also when the wait is interrupted
+                self._cond.notify_all()
+            self._owner, self._depth = me, 1
+            self._granted = (name, requested, perf_counter())
+
+    def release(self) -> None:
+        """Releases the bus and records the wait and hold times of the transaction."""
+        with self._cond:
+            self._depth -= 1
+            if self._depth:
+                return
+            name, requested, granted = self._granted
+            entry = self.stats.setdefault(name, {"transactions": 0, "wait": 0.0, "max_wait": 0.0, "hold": 0.0})
+            entry["transactions"] += 1
+            entry["wait"] += granted - requested
+            entry["max_wait"] = max(entry["max_wait"], granted - requested)
+            entry["hold"] += perf_counter() - granted
+            self._owner = None
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def transaction(self, name: str, priority: int = NORMAL):
+        """Context manager holding the bus for one transaction."""
+        self.acquire(name, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def attach(self, instrument, name: str, priority: int = NORMAL, methods=DEFAULT_METHODS):
+        """
+        Routes an instrument's I/O methods through the arbiter by wrapping them on the instance.
+        Methods in `methods` that the instrument does not have are ignored.
+        """
+        for method_name in methods:
+            method = getattr(instrument, method_name, None)
+            if callable(method):
+                setattr(instrument, method_name, self._wrap(method, name, priority))
+        return instrument
+
+    def _wrap(self, method, name: str, priority: int):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            self.acquire(name, priority)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.release()
+        return wrapper
+
+    def reset_stats(self) -> None:
+        """Clears the statistics, e.g. at the start of a run."""
+        with self._cond:
+            self.stats = {}
+            self._stats_start = perf_counter()
+
+    def report(self) -> dict:
+        """
+        Prints and returns bus usage since the last reset_stats(): per instrument the number of
+        transactions, total and maximum wait, total hold time and share of the elapsed time held.
+        """
+        elapsed = perf_counter() - self._stats_start
+        report = {"elapsed": elapsed, "instruments": {}}
+        print(f"\nGPIB bus usage over {elapsed:.1f} s:")
+        for name, entry in self.stats.items():
+            report["instruments"][name] = dict(entry, utilization=entry["hold"] / elapsed if elapsed else 0.0)
+            print(f"  {name:<28} {entry['transactions']:7d} transactions, wait {entry['wait']:8.3f} s "
+                  f"(max {entry['max_wait'] * 1e3:7.1f} ms), hold {entry['hold']:8.3f} s "
+                  f"({report['instruments'][name]['utilization']:.1%})")
+        busy = sum(entry["hold"] for entry in self.stats.values())
+        report["utilization"] = busy / elapsed if elapsed else 0.0
+        print(f"  Bus busy {report['utilization']:.1%} of the time.")
+        return report
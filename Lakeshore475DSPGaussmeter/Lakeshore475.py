@@ -1,6 +1,9 @@
+import numpy as np
 import pyvisa
-import struct
+import threading
 import time
+from GPIBBus.GPIB_Arbiter import TIME_CRITICAL
+from Timing.Deadline_Scheduler import DeadlineScheduler
 
 # External Dictionary Mappings
 MEASUREMENT_MODES = {"DC": "1", "RMS": "2", "Peak": "3"}
@@ -15,14 +18,31 @@ LOGGING_RATES = {"1": 1, "2": 10, "3": 30, "4": 100, "5": 200, "6": 400, "7": 80
 class LakeShore475:
     """Class for controlling the LakeShore 475 DSP Gaussmeter via GPIB."""
 
-    def __init__(self, gpib_address: str):
+    def __init__(self, gpib_address: str, bus=None):
         """
         Initialize the GPIB connection to the instrument.
         :param gpib_address: GPIB address string
+        :param bus: Optional GPIBArbiter shared with the other instruments on the bus;
+                    reads through it take priority over bulk transfers
         """
-        self.rm = pyvisa.ResourceManager()
+        if bus is None:
+            self.rm = pyvisa.ResourceManager()
+        else:
+            self.rm = bus.rm
+            bus.attach(self, "LakeShore475", TIME_CRITICAL, methods=("write", "query", "read_fast_data"))
         self.device = self.rm.open_resource(gpib_address)
         self.device.timeout = 5000  # Timeout in milliseconds
+        self.fast_chunks = []  # (host time before, host time after, readings) per RDGFAST? transfer
+        self._fast_thread = None
+        self._fast_stop = threading.Event()
+        self.field_count = self.temp_count = 0
+        self.field_before = self.field_after = self.sample_fields = np.empty(0)
+        self.temp_before = self.temp_after = self.sample_temps = np.empty(0)
+        self._sampler_thread = None
+        self._sampler_stop = threading.Event()
+        self.sampler_lateness = []  # Seconds each sampler wake-up came after its deadline
+        self._log_thread = None
+        self._log_result = None
         print(f"Connected to: {self.query('*IDN?')}")
 
     def self_test(self):
@@ -38,6 +58,19 @@ class LakeShore475:
         """Send a query command and return the response."""
         return self.device.query(command).strip()
 
+    def query_many(self, *commands: str, types=None):
+        """
+        Sends several queries as one GPIB transaction and returns the replies as a tuple.
+        :param commands: Query commands, e.g. "RDGFIELD?", "RDGTEMP?"
+        :param types: Optional callables (one per command) used to convert the replies
+        """
+        replies = [reply.strip() for reply in self.query(";".join(commands)).split(";")]
+        if len(replies) != len(commands):
+            raise ValueError(f"Expected {len(commands)} replies to {';'.join(commands)}, got {len(replies)}: {replies}")
+        if types is None:
+            return tuple(replies)
+        return tuple(convert(reply) for convert, reply in zip(types, replies))
+
     def clear_interface(self):
         """Clears the instrument interface."""
         self.write("*CLS")
@@ -120,6 +153,31 @@ class LakeShore475:
         """Reads the probe temperature in Celsius."""
         return float(self.query("RDGTEMP?"))
 
+    @property
+    def field_and_temperature(self):
+        """Reads the field and the probe temperature in a single transaction, as (field, temperature)."""
+        return self.query_many("RDGFIELD?", "RDGTEMP?", types=(float, float))
+
+    def benchmark_reads(self, n: int = 100):
+        """
+        Compares the latency of separate field/temperature queries with the single-transaction read.
+        :param n: Number of reads per method
+        :return: Dict of median and 99th percentile latencies in seconds for each method
+        """
+        results = {}
+        for name, read in (("separate", lambda: (self.field, self.temperature)),
+                           ("combined", lambda: self.field_and_temperature)):
+            latencies = []
+            for _ in range(n):
+                t = time.perf_counter()
+                read()
+                latencies.append(time.perf_counter() - t)
+            latencies.sort()
+            results[name] = {"median": latencies[n // 2], "p99": latencies[min(n - 1, int(n * 0.99))]}
+            print(f"{name:>8}: median {results[name]['median'] * 1e3:.2f} ms, p99 {results[name]['p99'] * 1e3:.2f} ms")
+        print(f"Speed-up: {results['separate']['median'] / results['combined']['median']:.2f}x")
+        return results
+
     @property
     def field_control_mode(self):
         """Gets the current field control mode."""
@@ -177,26 +235,248 @@ class LakeShore475:
         """Returns the number of data points stored in the Datalog buffer."""
         return int(self.query("DLOGNUM?"))
 
-    def get_log_data(self, num_points: int):
-        """Retrieves stored data from the buffer."""
-        return [float(self.query(f"DLOGRDG? {i}")) for i in range(1, num_points + 1)]
+    def get_log_data(self, num_points: int, points_per_query: int = 8, progress: bool = True):
+        """
+        Retrieves stored data from the buffer.
+        The 475 has no block read of the datalog: DLOGRDG? takes a single point number and
+        returns that one point, and there is no binary dump of the log. The fewest
+        transactions possible are therefore num_points / points_per_query, with the queries
+        of each transaction sent as one line (see query_many).
+        :param num_points: Number of points to read, starting from the first
+        :param points_per_query: Queries per transaction, limited by the instrument's input buffer
+        :param progress: Prints the number of points retrieved so far
+        :return: NumPy array of the logged values
+        """
+        data = np.empty(num_points)
+        for start in range(0, num_points, points_per_query):
+            stop = min(start + points_per_query, num_points)
+            data[start:stop] = self.query_many(*(f"DLOGRDG? {i}" for i in range(start + 1, stop + 1)),
+                                               types=(float,) * (stop - start))
+            if progress:
+                print(f"\rRetrieved {stop}/{num_points} logged points", end='' if stop < num_points else '\n')
+        return data
+
+    def record_log(self, duration: float, rate: int = 1000, points_per_query: int = 8):
+        """
+        Logs the field with the instrument's internal datalogger instead of host-side polling.
+        Returns as soon as logging has started: a background thread stops the log after
+        duration and reads it out, so the caller is not blocked. Poll log_ready, or call
+        log_data() to wait for the result.
+        :param duration: Logging time in seconds
+        :param rate: Logging rate in Hz, one of LOGGING_RATES
+        :param points_per_query: DLOGRDG? queries per transaction (see get_log_data)
+        """
+        if self._log_thread is not None and self._log_thread.is_alive():
+            raise RuntimeError("A datalog is already being recorded.")
+        self.logging_rate = rate
+        self._log_result = None
+        self.data_log(True)
+        self._log_thread = threading.Thread(target=self._log_worker, args=(duration, rate, points_per_query),
+                                            name="LakeShore475-DLOG", daemon=True)
+        self._log_thread.start()
+
+    def _log_worker(self, duration: float, rate: int, points_per_query: int):
+        """Stops the datalog after duration seconds and reads it out into self._log_result."""
+        fields = np.empty(0)
+        try:
+            time.sleep(duration)
+            self.data_log(False)
+            fields = self.get_log_data(self.data_log_num_points(), points_per_query, progress=False)
+        except Exception as e:
+            print(f"Datalog retrieval failed: {e}")
+        self._log_result = (np.arange(len(fields)) / rate, fields)
 
-    def read_fast_data(self, num_readings):
-        """Reads high-speed binary data using RDGFAST? command."""
-        self.device.write(f"RDGFAST? {num_readings}")
-        raw_data = self.device.read_raw()
+    @property
+    def log_ready(self):
+        """True once the datalog started by record_log() has been read out."""
+        return self._log_thread is not None and not self._log_thread.is_alive()
 
-        print(f"Raw Binary Data: {raw_data.hex()}")  # Debugging output
+    def log_data(self, timeout: float = None):
+        """
+        Waits for the datalog started by record_log() and returns it.
+        :param timeout: Seconds to wait at most; None waits until it has been read out
+        :return: Tuple (times, fields) of NumPy arrays, times in seconds from the first point,
+                 or None if it is not ready within timeout
+        """
+        if self._log_thread is None:
+            raise RuntimeError("No datalog was recorded; call record_log() first.")
+        self._log_thread.join(timeout)
+        return self._log_result
 
-        header_size = 2  
-        num_bytes = len(raw_data) - header_size
-        num_floats = num_bytes // 4  
+    def read_fast_data(self, num_readings: int, header_size: int = None):
+        """
+        Reads high-speed binary data using RDGFAST? command.
+        The reply is read up to the END of the transfer with the text termination disabled,
+        so nothing is left for the next read. The header size is derived from the reply
+        length (everything before the 4 * num_readings data bytes); if header_size is given,
+        a reply with a different header raises ValueError. A failed read is ended with a
+        device clear.
+        :param num_readings: Number of readings to transfer
+        :param header_size: Expected bytes preceding the big-endian float32 readings, or None
+        :return: NumPy array of the readings
+        """
+        read_termination = self.device.read_termination
+        self.device.read_termination = None
+        try:
+            self.write(f"RDGFAST? {num_readings}")
+            raw_data = self.device.read_raw()
+        except Exception:
+            self.stop_fast_data()
+            raise
+        finally:
+            self.device.read_termination = read_termination
+        header = len(raw_data) - 4 * num_readings
+        if header < 0 or (header_size is not None and header != header_size):
+            raise ValueError(f"RDGFAST? {num_readings} returned {len(raw_data)} bytes, expected "
+                             f"{'a header' if header_size is None else header_size} + {4 * num_readings} bytes of data.")
+        return np.frombuffer(raw_data, dtype=">f4", offset=header).astype(np.float64)
+
+    def stop_fast_data(self):
+        """Ends a RDGFAST? transfer with a device clear, discarding any bytes still being sent."""
+        self.device.clear()
+
+    def start_fast_stream(self, chunk_readings: int = 100, header_size: int = None):
+        """
+        Starts a background producer that repeats RDGFAST? transfers of chunk_readings
+        readings until stop_fast_stream(). Each transfer is appended to self.fast_chunks
+        with the host time before and after it.
+        This is not a gap-free stream, and cannot be made one on this instrument: every
+        transfer is a separate RDGFAST? command, and no readings are taken between the end
+        of one transfer and the start of the next. Double buffering does not help, since
+        the GPIB bus has one talker at a time and the 475 only parses the next RDGFAST?
+        once the previous reply has been read out. The worker re-issues the command right
+        after each read to keep the gaps short; fast_gaps gives that dead time per chunk.
+        """
+        if self._fast_thread is not None and self._fast_thread.is_alive():
+            return
+        self.fast_chunks = []
+        self._fast_stop.clear()
+        self._fast_thread = threading.Thread(target=self._fast_worker, args=(chunk_readings, header_size),
+                                             name="LakeShore475-RDGFAST", daemon=True)
+        self._fast_thread.start()
+
+    def stop_fast_stream(self):
+        """Stops the fast-read producer after its current transfer. Collected data remains available."""
+        if self._fast_thread is None:
+            return
+        self._fast_stop.set()
+        self._fast_thread.join()
+        self._fast_thread = None
+
+    def _fast_worker(self, chunk_readings: int, header_size: int):
+        """Repeats RDGFAST? transfers and appends them to self.fast_chunks."""
+        try:
+            while not self._fast_stop.is_set():
+                before = time.time()
+                readings = self.read_fast_data(chunk_readings, header_size)
+                self.fast_chunks.append((before, time.time(), readings))
+        except Exception as e:
+            print(f"RDGFAST? stream stopped: {e}")
+
+    @property
+    def fast_data(self):
+        """Returns all readings collected by the fast-read producer as one NumPy array."""
+        chunks = list(self.fast_chunks)
+        return np.concatenate([readings for _, _, readings in chunks]) if chunks else np.empty(0)
+
+    @property
+    def fast_gaps(self):
+        """
+        Host time in seconds between the end of the previous transfer and the start of each
+        chunk (0 for the first), i.e. a lower bound on the dead time before it.
+        """
+        chunks = list(self.fast_chunks)
+        if not chunks:
+            return np.empty(0)
+        return np.array([0.0] + [chunks[i][0] - chunks[i - 1][1] for i in range(1, len(chunks))])
 
-        if num_floats != num_readings:
-            print(f"Warning: Expected {num_readings} readings, but got {num_floats}")
+    def start_sampler(self, period: float, num_samples: int, temperature_period: float = None):
+        """
+        Starts reading field and temperature on a background thread.
+        Each quantity has its own fixed deadlines (start + k * period), so a slow query
+        delays only its own sample. When both are due they are read in one transaction;
+        a slower temperature rate leaves the bus free for faster field sampling.
+        The host time before and after each query is stored with the readings in
+        preallocated arrays (field_before, field_after, sample_fields and
+        temp_before, temp_after, sample_temps). Deadlines are kept with a sleep plus a
+        short spin; how late each wake-up was is kept in sampler_lateness.
+        :param period: Field sampling period in seconds
+        :param num_samples: Number of field samples to take
+        :param temperature_period: Temperature sampling period in seconds, period by default
+        """
+        if self._sampler_thread is not None and self._sampler_thread.is_alive():
+            return
+        temperature_period = period if temperature_period is None else temperature_period
+        num_temps = int(np.ceil(num_samples * period / temperature_period))
+        self.field_before, self.field_after, self.sample_fields = np.full((3, num_samples), np.nan)
+        self.temp_before, self.temp_after, self.sample_temps = np.full((3, num_temps), np.nan)
+        self.field_count = self.temp_count = 0
+        self._sampler_stop.clear()
+        self._sampler_thread = threading.Thread(target=self._sampler_worker,
+                                                args=(np.arange(num_samples) * period, np.arange(num_temps) * temperature_period),
+                                                name="LakeShore475-sampler", daemon=True)
+        self._sampler_thread.start()
+
+    def stop_sampler(self, finish: bool = False):
+        """
+        Stops the sampler thread after its current query. Samples taken so far remain available.
+        :param finish: Waits for the remaining scheduled samples instead of stopping early
+        """
+        if self._sampler_thread is None:
+            return
+        if not finish:
+            self._sampler_stop.set()
+        self._sampler_thread.join()
+        self._sampler_thread = None
+
+    def _sampler_worker(self, field_times: np.ndarray, temp_times: np.ndarray):
+        """Reads each quantity at its deadlines (seconds from start) until done or stopped."""
+        ticks = DeadlineScheduler([])                                           # Sleep plus short spin, as in the timing loops
+        self.sampler_lateness = []
+        t0 = time.perf_counter()
+        i = j = 0
+        try:
+            while i < len(field_times) or j < len(temp_times):
+                due = min(field_times[i] if i < len(field_times) else np.inf,
+                          temp_times[j] if j < len(temp_times) else np.inf)
+                # Event.wait() only resolves to ~15.6 ms on Windows: poll the stop flag in
+                # short slices until shortly before the deadline, then wait precisely
+                while t0 + due - time.perf_counter() > 0.1:
+                    if self._sampler_stop.wait(0.05):
+                        return
+                if self._sampler_stop.is_set():
+                    return
+                self.sampler_lateness.append(ticks.wait_until(t0 + due))
+                elapsed = time.perf_counter() - t0
+                read_field = i < len(field_times) and field_times[i] <= elapsed
+                read_temp = j < len(temp_times) and temp_times[j] <= elapsed
+                before = time.time()
+                if read_field and read_temp:
+                    field, temp = self.field_and_temperature
+                elif read_field:
+                    field = self.field
+                else:
+                    temp = self.temperature
+                after = time.time()
+                if read_field:
+                    self.field_before[i], self.field_after[i], self.sample_fields[i] = before, after, field
+                    i = self.field_count = i + 1
+                if read_temp:
+                    self.temp_before[j], self.temp_after[j], self.sample_temps[j] = before, after, temp
+                    j = self.temp_count = j + 1
+        except Exception as e:
+            print(f"Gaussmeter sampler stopped: {e}")
+
+    def sampler_data(self):
+        """
+        Returns the samples taken by the sampler, each quantity on its own time axis.
+        :return: Tuple (field_times, fields, temp_times, temperatures) of NumPy arrays; times are
+                 the midpoints of the host times before and after each query, in seconds since the epoch
+        """
+        n, m = self.field_count, self.temp_count
+        return ((self.field_before[:n] + self.field_after[:n]) / 2, self.sample_fields[:n],
+                (self.temp_before[:m] + self.temp_after[:m]) / 2, self.sample_temps[:m])
 
-        return [struct.unpack(">f", raw_data[header_size + (i * 4):header_size + (i + 1) * 4])[0] for i in range(num_floats)]
-    
     @property
     def trigger(self):
         """Gets the current trigger out state."""
@@ -210,6 +490,8 @@ class LakeShore475:
     def __del__(self):
         """Ensures the connection is closed when the object is deleted."""
         try:
+            self.stop_fast_stream()
+            self.stop_sampler()
             self.device.close()
             print(f"Connection closed.")
         except Exception as e:
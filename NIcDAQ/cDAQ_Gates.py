@@ -0,0 +1,103 @@
+# Precompiled gate control on the cDAQ-9172
+#
+# task.write([True, True, True]) makes nidaqmx work out the channel layout and
+# convert the Python list on every call. GateWriter compiles each named gate
+# state (e.g. "triple_rise") once into a port bit mask and writes it with a
+# reusable single-channel stream writer, so a transition is one driver call.
+
+from time import perf_counter_ns
+
+import numpy as np
+import nidaqmx
+from nidaqmx.constants import LineGrouping
+from nidaqmx.stream_writers import DigitalSingleChannelWriter
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class GateWriter(object):
+    """Static digital output of named gate states as precompiled port bit masks.
+
+    All lines go into one channel, so a state is written as a single unsigned
+    integer with bit n driving line n of the port.
+
+    Attributes:
+        lines (tuple): DIO line numbers, in the order of the state lists.
+        masks (dict): Port bit mask (np.uint32) by state name.
+    """
+
+    def __init__(self, module: str, lines, states: dict, port: int = 0):
+        self.lines = tuple(lines)
+        self.masks = {name: self.compile(state) for name, state in states.items() if len(state) == len(self.lines)}
+        self.task = nidaqmx.Task()
+        try:
+            self.task.do_channels.add_do_chan(",".join(f"{module}/port{port}/line{line}" for line in self.lines),
+                                              line_grouping=LineGrouping.CHAN_FOR_ALL_LINES)
+            self._write = DigitalSingleChannelWriter(self.task.out_stream).write_one_sample_port_uint32
+            self.task.start()
+        except Exception:
+            self.task.close()
+            raise
+
+    def compile(self, state) -> np.uint32:
+        """Port bit mask of one state, given as one bool per line."""
+        return np.uint32(sum(1 << line for line, high in zip(self.lines, state) if high))
+
+    def write(self, name: str) -> None:
+        """Writes a named state."""
+        self._write(self.masks[name])
+
+    def close(self) -> None:
+        self.task.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def latency_percentiles(latencies_ns) -> dict:
+    """Percentiles and maximum of latencies given in nanoseconds, in microseconds."""
+    latencies = np.asarray(latencies_ns, dtype=np.float64) / 1e3
+    result = {f"p{p:g}": float(np.percentile(latencies, p)) for p in PERCENTILES}
+    result["max"] = float(latencies.max())
+    return result
+
+
+def benchmark(module: str, lines, states: dict, repeats: int = 1000) -> dict:
+    """
+    Measures the latency of every state transition, cycling through `states` `repeats` times,
+    first with list writes to a one-channel-per-line task (as the measurement scripts used to do),
+    then with a GateWriter. Prints and returns the percentiles in microseconds per method.
+    """
+    sequence = [name for name, state in states.items() if len(state) == len(lines)] * repeats
+    results = {}
+
+    with nidaqmx.Task() as task:
+        for line in lines:
+            task.do_channels.add_do_chan(f"{module}/port0/line{line}")
+        task.start()
+        latencies = np.empty(len(sequence), dtype=np.int64)
+        for i, name in enumerate(sequence):
+            t = perf_counter_ns()
+            task.write(list(states[name]))
+            latencies[i] = perf_counter_ns() - t
+        results["list"] = latency_percentiles(latencies)
+
+    with GateWriter(module, lines, states) as gates:
+        latencies = np.empty(len(sequence), dtype=np.int64)
+        for i, name in enumerate(sequence):
+            t = perf_counter_ns()
+            gates.write(name)
+            latencies[i] = perf_counter_ns() - t
+        results["precompiled"] = latency_percentiles(latencies)
+
+    for method, result in results.items():
+        print(f"{method:>11}: " + ", ".join(f"{key} {value:8.1f} us" for key, value in result.items()))
+    return results
+
+
+if __name__ == "__main__":
+    benchmark("cDAQ1Mod5", (0, 1, 2), {"triple_rise": [True, True, True], "EXT_fall": [False, True, True],
+                                       "triple_fall": [False, False, False]})
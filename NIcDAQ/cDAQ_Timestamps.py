@@ -0,0 +1,126 @@
+# Hardware edge timestamps on the cDAQ-9172
+#
+# Software timestamps of a trigger (time() before and after task.write())
+# include the DO write latency and OS jitter. EdgeTimestamper instead lets a
+# chassis counter count a fixed timebase and latches the count on every rising
+# edge of a DIO line (as a PFI terminal of a correlated DIO module such as the
+# NI 9401 in slot 5 or 6). The counts are mapped to host time once, when the
+# counters are started. The cDAQ-9172 has two counters, so two lines can be
+# timestamped at a time, and not while HardwarePulseTrain is using them.
+
+from time import perf_counter, time
+
+import numpy as np
+import nidaqmx
+from nidaqmx.constants import AcquisitionType, CountDirection, Edge
+from nidaqmx.stream_readers import CounterReader
+
+TIMEBASES = {"80MHzTimebase": 80e6, "20MHzTimebase": 20e6, "100kHzTimebase": 100e3}
+ROLLOVER = 2 ** 32                                                              # Counters are 32 bits wide
+
+
+class EdgeTimestamper(object):
+    """Hardware timestamps of the rising edges on DIO lines, in host time.
+
+    The timebase count rolls over every 2**32 ticks (about 214 s at 20 MHz), so
+    poll() must be called at least that often during a run. It returns at once if
+    it was called less than `poll_interval` seconds ago, so it can sit in a timing loop.
+
+    Attributes:
+        lines (dict): PFI line number by name, e.g. {"bristol": 0, "lockins": 1}.
+        rate (float): Timebase frequency in Hz.
+        started (dict): Host time at which each counter was started.
+        start_uncertainty (float): Longest start call in seconds; bounds the error of the mapping to host time.
+    """
+
+    def __init__(self, module: str, lines: dict, counters=(0, 1), timebase: str = "20MHzTimebase",
+                 max_rate: float = 1000.0, buffer_size: int = 100000, poll_interval: float = 1.0):
+        if len(lines) > len(counters):
+            raise ValueError(f"{len(lines)} lines need {len(lines)} counters, only {len(counters)} given.")
+        chassis = module.rsplit("Mod", 1)[0]
+        self.lines = dict(lines)
+        self.rate = TIMEBASES[timebase]
+        self.poll_interval = poll_interval
+        self.started = {}
+        self.start_uncertainty = None
+        self.tasks = {}
+        self._readers = {}
+        self._ticks = {name: [] for name in lines}
+        self._last_poll = None
+
+        try:
+            for (name, line), counter in zip(self.lines.items(), counters):
+                task = nidaqmx.Task()
+                self.tasks[name] = task
+                channel = task.ci_channels.add_ci_count_edges_chan(f"{chassis}/_ctr{counter}", edge=Edge.RISING,
+                                                                   initial_count=0,
+                                                                   count_direction=CountDirection.COUNT_UP)
+                channel.ci_count_edges_term = f"/{chassis}/{timebase}"
+                task.timing.cfg_samp_clk_timing(max_rate, source=f"/{module}/PFI{line}", active_edge=Edge.RISING,
+                                                sample_mode=AcquisitionType.CONTINUOUS, samps_per_chan=buffer_size)
+                self._readers[name] = CounterReader(task.in_stream)
+        except Exception:
+            self.close()
+            raise
+
+    def start(self) -> None:
+        """Starts every counter and records its host start time. Call before the first edge."""
+        self._ticks = {name: [] for name in self.lines}
+        durations = []
+        for name, task in self.tasks.items():
+            before = time()
+            task.start()
+            after = time()
+            self.started[name] = (before + after) / 2
+            durations.append(after - before)
+        self.start_uncertainty = max(durations)
+        self._last_poll = perf_counter()
+
+    def poll(self, force: bool = False) -> None:
+        """Reads the edges latched since the last call and unwraps their counts."""
+        if not force and perf_counter() - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = perf_counter()
+        for name, task in self.tasks.items():
+            available = task.in_stream.avail_samp_per_chan
+            if not available:
+                continue
+            raw = np.empty(available, dtype=np.uint32)
+            self._readers[name].read_many_sample_uint32(raw, number_of_samples_per_channel=available, timeout=0)
+            elapsed = (time() - self.started[name]) * self.rate
+            # The first new edge happened since the last poll, i.e. within one rollover before now
+            first = int(raw[0]) + max(int((elapsed - int(raw[0])) // ROLLOVER), 0) * ROLLOVER
+            steps = np.diff(raw.astype(np.int64)) % ROLLOVER
+            self._ticks[name].append(first + np.concatenate(([0], np.cumsum(steps))))
+
+    def stop(self) -> None:
+        """Reads the remaining edges and stops the counters."""
+        self.poll(force=True)
+        for task in self.tasks.values():
+            task.stop()
+
+    def times(self, name: str) -> np.ndarray:
+        """Host times (seconds since the epoch) of the rising edges on one line."""
+        ticks = np.concatenate(self._ticks[name]) if self._ticks[name] else np.empty(0, dtype=np.int64)
+        return self.started[name] + ticks / self.rate
+
+    def report(self) -> None:
+        """Prints the number of edges and the period spread per line."""
+        print(f"Edge timestamps mapped to host time within {self.start_uncertainty * 1e3:.3f} ms.")
+        for name in self.lines:
+            times = self.times(name)
+            line = f"  {name:<10} {len(times):7d} edges"
+            if len(times) > 2:
+                periods = np.diff(times)
+                line += f", period {periods.mean() * 1e3:.4f} ms ± {periods.std() * 1e6:.2f} us"
+            print(line)
+
+    def close(self) -> None:
+        for task in self.tasks.values():
+            task.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,96 @@
+# Hardware-timed trigger pulses on the cDAQ-9172
+#
+# The chassis counters generate pulse trains from their own timebase, so the
+# pulse timing does not depend on how busy the host is. HardwarePulseTrain
+# drives one DIO line (as a PFI terminal of a correlated DIO module such as the
+# NI 9401 in slot 5 or 6) from counter 0 and counts the pulses actually
+# delivered with counter 1.
+
+from time import time
+
+import nidaqmx
+from nidaqmx.constants import AcquisitionType, Edge, Level
+
+
+class HardwarePulseTrain(object):
+    """Finite pulse train from a cDAQ chassis counter, with delivered pulses counted in hardware.
+
+    Each period is `high_time` high followed by `low_time` low, like the software
+    loop it replaces (rise, wait EXT_H, fall, wait EXT_L).
+
+    Attributes:
+        module (str): DIO module the pulses leave from, e.g. "cDAQ1Mod5".
+        terminal (str): Output terminal, e.g. "/cDAQ1Mod5/PFI0" for DIO0.
+        num_pulses (int): Pulses in the train.
+        period (float): high_time + low_time in seconds.
+        started (float): Host time at which the train was started (midpoint of the start call).
+    """
+
+    def __init__(self, module: str, high_time: float, low_time: float, num_pulses: int,
+                 line: int = 0, counter: int = 0, edge_counter: int = 1):
+        chassis = module.rsplit("Mod", 1)[0]
+        self.module = module
+        self.terminal = f"/{module}/PFI{line}"
+        self.num_pulses = num_pulses
+        self.period = high_time + low_time
+        self.started = None
+
+        self.task = nidaqmx.Task()
+        self.counter_task = nidaqmx.Task()
+        try:
+            channel = self.task.co_channels.add_co_pulse_chan_time(f"{chassis}/_ctr{counter}", idle_state=Level.LOW,
+                                                                   initial_delay=0.0, low_time=low_time,
+                                                                   high_time=high_time)
+            channel.co_pulse_term = self.terminal
+            self.task.timing.cfg_implicit_timing(sample_mode=AcquisitionType.FINITE, samps_per_chan=num_pulses)
+
+            edges = self.counter_task.ci_channels.add_ci_count_edges_chan(f"{chassis}/_ctr{edge_counter}",
+                                                                           edge=Edge.RISING, initial_count=0)
+            edges.ci_count_edges_term = f"/{chassis}/Ctr{counter}InternalOutput"
+        except Exception:
+            self.close()
+            raise
+
+    def start(self) -> float:
+        """Starts counting, then the pulse train. Returns the host start time."""
+        self.counter_task.start()
+        before = time()
+        self.task.start()
+        self.started = (before + time()) / 2
+        return self.started
+
+    @property
+    def delivered(self) -> int:
+        """Number of pulses delivered so far."""
+        return int(self.counter_task.read())
+
+    @property
+    def done(self) -> bool:
+        """True once every pulse has been generated."""
+        return self.task.is_task_done()
+
+    def wait_until_done(self, timeout: float = None) -> None:
+        """Blocks until the train has finished (or `timeout` seconds have passed)."""
+        self.task.wait_until_done(timeout=-1 if timeout is None else timeout)
+
+    def stop(self) -> int:
+        """Stops the train, leaving the line low. Returns the number of pulses delivered."""
+        self.task.stop()
+        delivered = self.delivered
+        self.counter_task.stop()
+        return delivered
+
+    def pulse_times(self, n: int = None):
+        """Host times of the rising edges, from the start time and the hardware period."""
+        n = self.num_pulses if n is None else n
+        return [self.started + k * self.period for k in range(n)]
+
+    def close(self) -> None:
+        self.task.close()
+        self.counter_task.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,99 @@
+# Deadline scheduler for the measurement timing loops
+#
+# Each tick is due at a fixed offset from the start, so a late tick never
+# shifts the ones after it. The wait sleeps until shortly before the deadline
+# and spins only for the last `spin` seconds, yielding the CPU with sleep(0)
+# unless `yield_cpu` is off, so it stays mostly idle while still waking close
+# to the deadline. On Linux with Python 3.13+, the coarse wait can use a
+# timerfd instead of sleep(); elsewhere (e.g. Windows) sleep() is used.
+# How late every tick woke is recorded, so overruns show up in report().
+
+import os
+import time
+from time import perf_counter, sleep
+
+import numpy as np
+
+
+class DeadlineScheduler(object):
+    """Runs a loop on an absolute schedule of offsets (seconds from the start).
+
+    Iterating over run() yields the index of each tick once it is due:
+
+        ticks = DeadlineScheduler(times)
+        for i in ticks.run():
+            ...
+        ticks.report()
+
+    Attributes:
+        times (np.ndarray): Tick offsets in seconds from the start.
+        lateness (np.ndarray): Seconds each tick woke after its deadline (NaN for ticks not reached).
+        count (int): Ticks reached in the last run.
+        spin (float): Seconds before each deadline at which the coarse wait ends and spinning starts.
+        yield_cpu (bool): Yields the CPU with sleep(0) while spinning instead of busy-waiting.
+        overrun (float): Lateness in seconds above which a tick counts as an overrun.
+    """
+
+    def __init__(self, times, spin: float = 0.001, timerfd: bool = False, overrun: float = 0.001,
+                 yield_cpu: bool = True):
+        self.times = np.asarray(times, dtype=np.float64)
+        self.spin = spin
+        self.yield_cpu = yield_cpu
+        self.overrun = overrun
+        self.lateness = np.full(len(self.times), np.nan)
+        self.count = 0
+        self.t0 = None
+        clock = getattr(time, "CLOCK_MONOTONIC", None)                         # Unix only
+        self._fd = os.timerfd_create(clock) if timerfd and clock is not None and hasattr(os, "timerfd_create") else None
+
+    def wait_until(self, deadline: float) -> float:
+        """Waits for a perf_counter() deadline. Returns how late it woke, in seconds."""
+        coarse = deadline - perf_counter() - self.spin
+        if coarse > 1e-6:
+            if self._fd is not None:
+                os.timerfd_settime(self._fd, initial=coarse)
+                os.read(self._fd, 8)
+            else:
+                sleep(coarse)
+        while perf_counter() < deadline:
+            if self.yield_cpu:
+                sleep(0)
+        return perf_counter() - deadline
+
+    def run(self, t0: float = None):
+        """Yields the index of each tick at its deadline; t0 is the perf_counter() start (now by default)."""
+        self.t0 = perf_counter() if t0 is None else t0
+        self.lateness[:] = np.nan
+        self.count = 0
+        for i, offset in enumerate(self.times):
+            self.lateness[i] = self.wait_until(self.t0 + offset)
+            self.count = i + 1
+            yield i
+
+    @property
+    def overruns(self) -> int:
+        """Number of ticks in the last run that woke more than `overrun` seconds late."""
+        return int(np.sum(self.lateness[:self.count] > self.overrun))
+
+    def report(self, name: str = "Timing loop") -> dict:
+        """Prints and returns the median, 99th percentile and maximum lateness and the number of overruns."""
+        lateness = self.lateness[:self.count]
+        if not len(lateness):
+            return {}
+        report = {"ticks": self.count, "median": float(np.median(lateness)), "p99": float(np.percentile(lateness, 99)),
+                  "max": float(lateness.max()), "overruns": self.overruns}
+        print(f"{name}: {report['ticks']} ticks, lateness median {report['median'] * 1e3:.3f} ms, "
+              f"p99 {report['p99'] * 1e3:.3f} ms, max {report['max'] * 1e3:.3f} ms; "
+              f"{report['overruns']} ticks more than {self.overrun * 1e3:g} ms late.")
+        return report
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,30 @@
+# Timestamp formatting shared by the instrument drivers and measurement scripts
+#
+# Buffers are timestamped as float epoch seconds and written as local
+# YYYY-MM-DDTHH:MM:SS.fff strings. Formatting goes through NumPy datetime64
+# instead of one strftime call per sample. The UTC offset is looked up once per
+# quarter hour covered by the data, so a run across a daylight saving change
+# gets the right offset on both sides of it.
+
+from time import localtime
+
+import numpy as np
+
+OFFSET_STEP = 900  # [s] UTC offsets only change on quarter-hour boundaries
+
+
+def utc_offsets(times: np.ndarray) -> np.ndarray:
+    """Returns the local UTC offset [s] in effect at each epoch time."""
+    times = np.asarray(times, dtype=np.float64)
+    quarters, position = np.unique(np.floor(times / OFFSET_STEP), return_inverse=True)
+    offsets = np.array([localtime(quarter * OFFSET_STEP).tm_gmtoff for quarter in quarters], dtype=np.float64)
+    return offsets[position.reshape(times.shape)]
+
+
+def format_timestamps(times: np.ndarray) -> np.ndarray:
+    """Formats epoch times as local YYYY-MM-DDTHH:MM:SS.fff strings without a per-sample Python loop."""
+    times = np.asarray(times, dtype=np.float64)
+    if not times.size:
+        return np.zeros(times.shape, dtype="<U23")
+    milliseconds = np.round((times + utc_offsets(times)) * 1000).astype(np.int64)
+    return np.datetime_as_string(milliseconds.astype("datetime64[ms]"), unit="ms")
@@ -1,12 +1,22 @@
 import os, sys, datetime
 from time import time, sleep, perf_counter, strftime, localtime
 from datetime import datetime as dt
+from contextlib import nullcontext
+from itertools import zip_longest
 import nidaqmx.system, nidaqmx.system.storage
 from toptica.lasersdk.dlcpro.v2_5_3 import DLCpro, SerialConnection, DeviceNotFoundError
 from TopticaDLCpro.topticadlcpro import LaserController
 from Bristol871.bristol_871A import Bristol871
+from NIcDAQ.cDAQ_Trigger import HardwarePulseTrain
+from NIcDAQ.cDAQ_Timestamps import EdgeTimestamper
+from NIcDAQ.cDAQ_Gates import GateWriter
+from Timing.Deadline_Scheduler import DeadlineScheduler
+from Timing.Timestamps import format_timestamps
 from Lakeshore475DSPGaussmeter.lakeshore475 import LakeShore475
-from pymeasure.instruments.signalrecovery import DSP7265
+from GPIBBus.GPIB_Arbiter import GPIBArbiter, BULK
+from DSP7265LockIn.LockIn_Pipeline import LockInBufferPipeline
+from DSP7265LockIn.LockIn_Segments import SegmentedLockInAcquisition
+from DSP7265LockIn.DSP7265_Binary import DSP7265Binary
 from Thorlabs.TC300.TC300_COMMAND_LIB import TC300
 import numpy as np
 
@@ -49,6 +59,11 @@ class Main:
         self.aver_stat = 'OFF'                                                                  # 'ON' or 'OFF'
         self.aver_type = 'WAV'
         self.aver_coun = 20
+        self.live_stream = False                                                                # True -> stream live wavelength over RS-422 during measurement
+        self.hw_trigger = False                                                                 # True -> EXT trigger pulses generated by a cDAQ counter
+        self.edge_timestamps = False                                                            # True -> timestamp gate edges with the cDAQ counters (needs hw_trigger False)
+        self.trigger_times = None                                                               # Hardware times of the Bristol triggers of the last run, if known
+        self.timerfd = False                                                                    # True -> timing loops wait on a Linux timerfd (Python 3.13+)
 
         """TOPTICA DLC pro"""
         self.dlc_port = 'COM4'                                                                  # Serial port number
@@ -91,16 +106,23 @@ class Main:
                    "reference": "external rear", "slope": 24, "trigger_mode": 0, "length": 16384, "interval": 100e-3},
         }
 
-        self.lockins = {name: DSP7265(settings["gpib"], f"{name} Lock-in Amplifier") for name, settings in lockin_settings.items()}
+        self.bus = GPIBArbiter()                                                                # Shared by the lock-ins and the gaussmeter
+        self.lockins = {name: self.bus.attach(DSP7265Binary(settings["gpib"], f"{name} Lock-in Amplifier", visa_library=self.bus.visa_library),
+                                              name, BULK)
+                        for name, settings in lockin_settings.items()}
         self.lockin_settings = lockin_settings
+        self.lockin_pipeline = LockInBufferPipeline(self.lockins, lockin_settings)
+        self.lockin_segments = SegmentedLockInAcquisition(self.lockins, lockin_settings)          # Drains buffers during long runs
 
         """Lakeshore 475 DSP Gaussmeter"""
         self.gpib_gaussmeter = "GPIB1::11::INSTR"
-        self.g = LakeShore475(self.gpib_gaussmeter)
+        self.g = LakeShore475(self.gpib_gaussmeter, bus=self.bus)                               # Pre-empts lock-in transfers on the bus
         self.g.auto = True                                                                      # 'ON' or 'OFF'
         self.g.units = 'Gauss'                                                                  # [G] or [T]
         self.gauss_rate = 10                                                                    # [Hz]
         self.gauss_period = 1 / self.gauss_rate                                                 # [s]
+        self.gauss_temp_rate = 0.5                                                              # [Hz] Probe temperature, sampled on its own time axis
+        self.gauss_temp_period = 1 / self.gauss_temp_rate                                       # [s]
         self.gauss_Nperiods = int(self.WideScanDuration / self.gauss_period)                    # [s]
         self.gauss_times = [ (i*self.gauss_period) for i in range(self.gauss_Nperiods) ]        # Gaussmeter measurement time array
 
@@ -122,6 +144,8 @@ class Main:
         self.triple_rise = [True, True, True]
         self.EXT_fall = [False, True, True]
         self.triple_fall = [False, False, False]
+        self.gate_states = {"double_rise": self.double_rise, "double_fall": self.double_fall,
+                            "triple_rise": self.triple_rise, "EXT_fall": self.EXT_fall, "triple_fall": self.triple_fall}
 
     def config_NIcDAQ(self):
         """NI-cDAQ-9172, using Mod4 for trigger signal control"""
@@ -158,19 +182,22 @@ class Main:
         """Bristol wavelenght meter, model 871A-VIS"""
         try:
             print('\n======================= Configure Bristol Wavelengthmeter 871A-VIS =======================')
-            print('Detector type =          ', self.b.detector('CW'))                           # Detector type = CW
-            print('Auto exposure =          ', self.b.auto_exposure)
-            print('Calibration method =     ', self.b.calibration_method)
-            self.b.calibration_temp(self.delta_temp)                                                  # Temperature delta = 0.5°C
-            print('Trigger method =         ', self.b.trigger_method)
+            # One batched transaction: detector = CW, temperature delta, frame rate (INT only), then read back
+            state = self.b.configure(detector='CW', calibration_temp=self.delta_temp,
+                                     frame_rate=self.frame_rate if self.b.trigger_method == 'INT' else None)
+            print('Detector type =          ', state['detector'])
+            print('Auto exposure =          ', state['auto_exposure'])
+            print('Calibration method =     ', state['calibration_method'])
+            print(f'Temperature delta =       {int(state["calibration_temp"]) / 10}°C.')
+            print('Trigger method =         ', state['trigger_method'])
             if self.b.trigger_method == 'INT':
-                self.b.frame_rate = self.frame_rate
-                print('Frame rate =             ', self.b.frame_rate, 'Hz\n')
+                print('Frame rate =             ', state['frame_rate'], 'Hz\n')
                 # print('Average method =         ', self.b.average_state(self.aver_stat))
                 # print('Average data type =      ', self.b.average_data(self.aver_type))
                 # print('Average count =          ', self.b.average_count(self.aver_coun))
             else:
                 print('Frame rate =             ', round(1/self.EXT_peri), 'Hz\n')
+            print(f"Round trips saved by batching: {self.b.batch_stats['round_trips_saved']}")
             self.b.calibrate()                                                                      # Calibrate Bristol before the measurement
             print('==================== Bristol Wavelengthmeter Configuration Complete ======================')
         except Exception as e:
@@ -193,28 +220,17 @@ class Main:
 
     def config_lock_ins(self):
         """Configure all lock-ins using a loop."""
+        t0 = perf_counter()
         try:
             print('\n============================== Configure Lock-in Amplifiers ==============================')
             for name, lockin in self.lockins.items():
                 settings = self.lockin_settings[name]
 
-                # Assign values instead of calling methods
-                lockin.harmonic_values = settings["harmonic"]
-                lockin.reference_phase = settings["phase"]
-                lockin.gain = settings["gain"]
-                lockin.sensitivity = settings["sens"]
-                lockin.time_constant = settings["TC"]
-                lockin.coupling = settings["coupling"]
-                lockin.vmode(settings["vmode"])
-                lockin.imode = settings["imode"]
-                lockin.fet = settings["fet"]
-                lockin.shield = settings["shield"]
-                lockin.reference = settings["reference"]
-                lockin.slope = settings["slope"]
-                lockin.curve_buffer_triggered = settings["trigger_mode"]
-
-                print(f"{name} Lock-in Amplifier successfully configured!")
+                # Only settings that differ from the cached state are written (read in one query on the first call)
+                changes = lockin.configure(settings)
+                print(f"{name} Lock-in Amplifier successfully configured! ({len(changes)} settings changed)")
             print('======================= Lock-in Amplifiers Configuration Complete ========================')
+            print(f"Lock-in setup took {perf_counter() - t0:.2f} s.")
         except Exception as e:
             print(f"SR7265 Lock-in amplifier configuration failed: {e}")
             sys.exit(1)
@@ -243,14 +259,14 @@ class Main:
 
     def EXT_trig_measure(self):
         """External trgiger mrthod for Bristol wavelength meter during measurements"""
+        if self.hw_trigger:
+            return self.EXT_hw_trig_measure()
         print('Bristol wavelength meter is operating at EXTERNAL trigger mode...')
-        with nidaqmx.Task() as task:
-            task.do_channels.add_do_chan(f"{self.NI_channel}/port0/line0")                      # DIO0: Gate12, Bristol
-            task.do_channels.add_do_chan(f"{self.NI_channel}/port0/line1")                      # DIO1: Gate16, lock-ins
-            task.do_channels.add_do_chan(f"{self.NI_channel}/port0/line2")                      # DIO2: Gate17, Toptica DLC pro
-            task.start()
+        self.trigger_times = None
+        with GateWriter(self.NI_channel, (0, 1, 2), self.gate_states) as gates, self.edge_timestamper({"bristol": 0, "lockins": 1}) as edges:
+            # DIO0: Gate12, Bristol; DIO1: Gate16, lock-ins; DIO2: Gate17, Toptica DLC pro
             i = 0
-            timestamps, fields, temps = [], [], [], []
+            timestamps = []
             timestamps_before_rise = []
             timestamps_after_rise = []
             try:
@@ -260,54 +276,120 @@ class Main:
                     self.countdown(5)
                     print("\n======================= Wide Scan Initiated =======================")
                     self.b.buffer_control('OPEN')
-                    while i < self.EXT_NPeri:
-                        if i == 0:
-                            t0 = perf_counter()
-                        while perf_counter() - t0 < self.EXT_times[i]:
-                            pass
-                        timestamps_before_rise.append(time())
-                        task.write(self.triple_rise)
-                        timestamps_after_rise.append(time())
-                        t1 = perf_counter()
-                        while perf_counter() - t1 < (self.EXT_H):
-                            pass
-                        task.write(self.EXT_fall)
-                        fields.append(self.g.field)
-                        temps.append(self.g.temperature)
+                    if self.live_stream:
+                        self.b.start_stream()                                                           # Live wavelength over RS-422
+                    if self.b.plan_segments(self.WideScanDuration, 1 / self.EXT_peri):
+                        self.b.begin_segments(self.WideScanDuration, 1 / self.EXT_peri)                 # Run exceeds the MMEM buffer
+                    self.g.start_sampler(self.gauss_period, self.gauss_Nperiods, self.gauss_temp_period)    # Gaussmeter reads on their own thread
+                    self.lockin_segments.start(self.WideScanDuration)
+                    if edges is not None:
+                        edges.start()
+                    ticks = DeadlineScheduler([t + edge for t in self.EXT_times for edge in (0, self.EXT_H)],   # Rise, then fall EXT_H later
+                                              timerfd=self.timerfd)
+                    t0 = perf_counter()
+                    for k in ticks.run(t0):
+                        if k % 2 == 0:
+                            timestamps_before_rise.append(time())
+                            gates.write("triple_rise")
+                            timestamps_after_rise.append(time())
+                            continue
+                        gates.write("EXT_fall")
+                        self.b.poll_segments(perf_counter() - t0)
+                        if edges is not None:
+                            edges.poll()
                         i = i + 1
                         print(f"\rTime remaining:          {int(self.WideScanDuration-i*self.EXT_peri):4d}", 's', end='')
                     sleep(self.EXT_L)
+                    self.b.buffer_control('CLOS')                                                       # Closed first: the buffer end anchors the frame times
+                    self.g.stop_sampler(finish=True)
+                    self.lockin_segments.stop()
                     for lockin in self.lockins.values():
                         lockin.halt_buffer()
-                    self.b.buffer_control('CLOS')
-                    elap_time = perf_counter() - t0
-                    task.write(self.triple_fall)
+                    self.b.stop_stream()
+                    gates.write("triple_fall")
+                    if edges is not None:
+                        edges.stop()
                     print("======================= Wide Scan Completed =======================")
+                    ticks.report("Trigger loop")
+                    ticks.close()
                     dlc.laser2.wide_scan.stop()
                     # result = self.dlcpro.get_recorder_data(dlc.laser2)
                     # self.dlcpro.save_recorder_data(DLCpro_path, f'DLCpro_WideScan_{dt.now().strftime("%Y-%m-%d")}.csv', result)
             except DeviceNotFoundError:
                 sys.stderr.write('TOPTICA DLC pro not found')
             print(f'{self.EXT_NPeri} periods of {self.EXT_peri} seconds')
-            task.stop()
             start_time = (timestamps_before_rise[0]+timestamps_after_rise[0]) / 2
+            elap_time = (timestamps_before_rise[-1] + timestamps_after_rise[-1]) / 2 - start_time       # Up to the last trigger
             for j in range(len(timestamps_before_rise)):
                 timestamp = (timestamps_before_rise[j] + timestamps_after_rise[j]) / 2          # Average of before and after write
                 formatted_timestamp = strftime("%Y-%m-%dT%H:%M:%S.", localtime(timestamp)) + f"{timestamp % 1:.3f}".split(".")[1]
                 timestamps.append(formatted_timestamp)
+            start_time, timestamps = self.edge_times(edges, start_time, timestamps)
+            g_times, fields, t_times, temps = self.g.sampler_data()
+            g_timestamps = list(format_timestamps(g_times))
+            t_timestamps = list(format_timestamps(t_times))
 
-        return start_time, elap_time, timestamps, fields, temps
+        return start_time, elap_time, timestamps, g_timestamps, fields, t_timestamps, temps
     
+    def EXT_hw_trig_measure(self):
+        """External trigger method with the Bristol pulse train generated by a cDAQ counter (DIO0)"""
+        print('Bristol wavelength meter is operating at EXTERNAL trigger mode (hardware-timed)...')
+        with GateWriter(self.NI_channel, (1, 2), self.gate_states) as gates, HardwarePulseTrain(self.NI_channel, self.EXT_H, self.EXT_L, self.EXT_NPeri) as pulses:
+            # DIO0: Gate12, Bristol (pulse train); DIO1: Gate16, lock-ins; DIO2: Gate17, Toptica DLC pro
+            delivered = 0
+            try:
+                with DLCpro(SerialConnection(self.dlc_port)) as dlc:
+                    dlc.laser2.wide_scan.start()
+                    print(f'Scan duration =          {int(self.WideScanDuration):4d}', 's')
+                    self.countdown(5)
+                    print("\n======================= Wide Scan Initiated =======================")
+                    self.b.buffer_control('OPEN')
+                    if self.live_stream:
+                        self.b.start_stream()                                                           # Live wavelength over RS-422
+                    if self.b.plan_segments(self.WideScanDuration, 1 / self.EXT_peri):
+                        self.b.begin_segments(self.WideScanDuration, 1 / self.EXT_peri)                 # Run exceeds the MMEM buffer
+                    self.g.start_sampler(self.gauss_period, self.gauss_Nperiods, self.gauss_temp_period)    # Gaussmeter reads on their own thread
+                    self.lockin_segments.start(self.WideScanDuration)
+                    before = time()
+                    gates.write("double_rise")                                                  # Gates stay high for the whole scan
+                    start_time = (before + time()) / 2                                          # Gate rise: t0 of the lock-in time base
+                    t0 = perf_counter()
+                    pulses.start()
+                    while not pulses.done:
+                        self.b.poll_segments(perf_counter() - t0)
+                        print(f"\rTime remaining:          {int(self.WideScanDuration-(perf_counter()-t0)):4d}", 's', self.live_status(), end='')
+                        sleep(0.1)
+                    delivered = pulses.stop()
+                    closed = time()
+                    self.b.buffer_control('CLOS')                                                       # Closed first: the buffer end anchors the frame times
+                    elap_time = (pulses.pulse_times(delivered)[-1] if delivered else closed) - start_time  # Up to the last pulse
+                    self.g.stop_sampler(finish=True)
+                    self.lockin_segments.stop()
+                    for lockin in self.lockins.values():
+                        lockin.halt_buffer()
+                    self.b.stop_stream()
+                    gates.write("double_fall")
+                    print("======================= Wide Scan Completed =======================")
+                    dlc.laser2.wide_scan.stop()
+            except DeviceNotFoundError:
+                sys.stderr.write('TOPTICA DLC pro not found')
+            print(f'{delivered} of {self.EXT_NPeri} pulses of {self.EXT_peri} seconds delivered')
+            self.trigger_times = pulses.pulse_times(delivered)                                  # On the chassis timebase
+            timestamps = list(format_timestamps(self.trigger_times))
+            g_times, fields, t_times, temps = self.g.sampler_data()
+            g_timestamps = list(format_timestamps(g_times))
+            t_timestamps = list(format_timestamps(t_times))
+
+        return start_time, elap_time, timestamps, g_timestamps, fields, t_timestamps, temps
+
     def INT_trig_measure(self):
         """Internal trgiger mrthod for Bristol wavelength meter during measurements"""
         print('Bristol wavelength meter is operating at INTERNAL trigger mode...')
-        with nidaqmx.Task() as task:
+        self.trigger_times = None
+        with GateWriter(self.NI_channel, (1, 2), self.gate_states) as gates, self.edge_timestamper({"lockins": 1}) as edges:
             # Logic TTL at the selected DIO channel gates
-            task.do_channels.add_do_chan(f"{self.NI_channel}/port0/line1")                      # DIO1: Gate16, lock-ins
-            task.do_channels.add_do_chan(f"{self.NI_channel}/port0/line2")                      # DIO2: Gate17, Toptica DLC pro
-            task.start()
-            i = 0
-            b_timestamps, g_timestamps, fields, temps = [], [], [], []
+            # DIO1: Gate16, lock-ins; DIO2: Gate17, Toptica DLC pro
+            b_timestamps = []
             try:
                 with DLCpro(SerialConnection(self.dlc_port)) as dlc:
                     # dlcpro.laser1.wide_scan.start()
@@ -316,55 +398,56 @@ class Main:
                     self.countdown(5)
                     print("\n=============== Wide Scan Initiated ===============")
                     self.b.buffer_control('OPEN')                                               # Essentially a gated open buffer command
+                    if self.live_stream:
+                        self.b.start_stream()                                                           # Live wavelength over RS-422
+                    if self.b.plan_segments(self.WideScanDuration, self.frame_rate):
+                        self.b.begin_segments(self.WideScanDuration, self.frame_rate)                   # Run exceeds the MMEM buffer
+                    if edges is not None:
+                        edges.start()
                     start_time = time()
-                    task.write(self.double_rise)
+                    gates.write("double_rise")
 
+                    self.g.start_sampler(self.gauss_period, self.gauss_Nperiods, self.gauss_temp_period)    # Gaussmeter reads on their own thread
+                    self.lockin_segments.start(self.WideScanDuration)
+                    ticks = DeadlineScheduler(self.gauss_times, timerfd=self.timerfd)
                     t0 = perf_counter()  # High-precision reference start time
-
-                    while i < self.gauss_Nperiods:
-                        target_time = t0 + self.gauss_times[i]  # Precompute exact target time
-                        
-                        # Hybrid sleep strategy: Coarse sleep first, then fine-tune with busy wait
-                        wait_time = target_time - perf_counter()
-                        if wait_time > 0.002:
-                            sleep(wait_time - 0.001)
-                        
-                        while perf_counter() < target_time:
-                            if target_time - perf_counter() > 0.001:
-                                sleep(0)  # Yield CPU to prevent excessive busy-waiting
-                        
-                        # Record gaussmeter measurements
-                        fields.append(self.g.field)
-                        temps.append(self.g.temperature)
-
-                        i += 1  # Move to next gaussmeter measurement
-                    
-                        print(f"\rTime remaining:          {int(self.WideScanDuration-i*self.gauss_period):4d}", 's', end='')
+                    for i in ticks.run(t0):
+                        self.b.poll_segments(perf_counter() - t0)
+                        if edges is not None:
+                            edges.poll()
+                        print(f"\rTime remaining:          {int(self.WideScanDuration-(i+1)*self.gauss_period):4d}", 's', self.live_status(), end='')
+                    closed = time()
+                    self.b.buffer_control('CLOS')                                                       # Closed first: the buffer end anchors the frame times
+                    elap_time = closed - start_time                                                     # Gate rise to CLOS
+                    self.g.stop_sampler(finish=True)
+                    self.lockin_segments.stop()
                     for lockin in self.lockins.values():
                         lockin.halt_buffer()
-                    self.b.buffer_control('CLOS')
-                    elap_time = perf_counter() - t0
-                    task.write(self.double_fall)
+                    self.b.stop_stream()
+                    if edges is not None:
+                        edges.stop()
+                    gates.write("double_fall")
                     print("\n=============== Wide Scan Completed ===============")
+                    ticks.report("Gaussmeter loop")
+                    ticks.close()
                     dlc.laser2.wide_scan.stop()
                     # result = self.dlcpro.get_recorder_data(dlc.laser2)
                     # self.dlcpro.save_recorder_data(DLCpro_path, f'DLCpro_WideScan_{dt.now().strftime("%Y-%m-%d")}.csv', result)
             except DeviceNotFoundError:
                 sys.stderr.write('TOPTICA DLC pro not found')
-            task.stop()
+            start_time, _ = self.edge_times(edges, start_time, [])
             b_timestamp = [start_time + INT_time for INT_time in self.INT_times]
             for j in range(self.INT_NPeri):
                 formatted_b_timestamp = strftime("%Y-%m-%dT%H:%M:%S.", localtime(b_timestamp[j])) + f"{b_timestamp[j] % 1:.3f}".split(".")[1]
                 b_timestamps.append(formatted_b_timestamp)
-            g_timestamp = [start_time + gauss_time for gauss_time in self.gauss_times]
-            for k in range(self.gauss_Nperiods):
-                formatted_g_timestamp = strftime("%Y-%m-%dT%H:%M:%S.", localtime(g_timestamp[k])) + f"{g_timestamp[k] % 1:.3f}".split(".")[1]
-                g_timestamps.append(formatted_g_timestamp)
+            g_times, fields, t_times, temps = self.g.sampler_data()
+            g_timestamps = list(format_timestamps(g_times))
+            t_timestamps = list(format_timestamps(t_times))
 
-        return start_time, elap_time, b_timestamps, g_timestamps, fields, temps
+        return start_time, elap_time, b_timestamps, g_timestamps, fields, t_timestamps, temps
 
-    def save_gaussmeter_data(self, path, filename, timestamps, fields, temps):
-        """Save Gaussmeter data to a CSV file."""
+    def save_gaussmeter_data(self, path, filename, timestamps, fields, temp_timestamps, temps):
+        """Save Gaussmeter data to a CSV file. Field and temperature have separate timestamp columns."""
         # Generate file path with unique naming
         folder_name = datetime.datetime.now().strftime("%m-%d-%Y")
         folder_path = os.path.join(path, folder_name)
@@ -380,12 +463,12 @@ class Main:
 
         try:
             with open(file_path, "w") as log:
-                header = "Timestamp,MagneticFluxDensity(G),Temperature(C)\n"
+                header = "Timestamp,MagneticFluxDensity(G),TemperatureTimestamp,Temperature(C)\n"
                 log.write(header)
-                for timestamp,field,temp in zip(timestamps,fields,temps):
-                    log.write(f"{timestamp},{field},{temp}\n")
+                for timestamp,field,temp_timestamp,temp in zip_longest(timestamps,fields,temp_timestamps,temps,fillvalue=""):
+                    log.write(f"{timestamp},{field},{temp_timestamp},{temp}\n")
 
-            print(f"Successfully saved {len(timestamps)} measurements from Lakeshore 475 DSP Gaussmeter.")
+            print(f"Successfully saved {len(timestamps)} field and {len(temps)} temperature measurements from Lakeshore 475 DSP Gaussmeter.")
         except Exception as e:
             print(f"Error saving data: {e}")
 
@@ -393,29 +476,6 @@ class Main:
         """Retrieve data from all lock-in amplifiers' buffers."""
         print("\nRetrieving data from lock-in amplifiers buffer...")
 
-        data = []
-        timestamps = []
-
-        for name, lockin in self.lockins.items():
-            try:
-                raw = lockin.get_buffer(quantity=None, convert_to_float=False, wait_for_buffer=True)
-                XY = lockin.buffer_to_float(raw, sensitivity=self.lockin_settings[name]["sens"], raise_error=True)
-                X, Y = XY["x"], XY["y"]
-                status = lockin.curve_buffer_status
-                print(f"{name} buffer status: {status}")
-
-                data.extend([X, Y])
-            except Exception as e:
-                print(f"Error retrieving data from {name} lock-in: {e}")
-
-        # Generate timestamps for lock-ins
-        timestamp_values = [t0 + n * self.lockin_settings["2f"]["interval"] for n in range(len(data[0]))]
-        timestamps = [
-            strftime("%Y-%m-%dT%H:%M:%S.", localtime(t)) + f"{t % 1:.3f}".split(".")[1]
-            for t in timestamp_values
-        ]
-        data.insert(0, timestamps)
-
         # Save lock-in buffer data
         try:
             counter = 1
@@ -430,18 +490,16 @@ class Main:
 
             file_path = os.path.join(folder_path, filename)
 
-            with open(file_path, "w") as log:
-                for key, lockin in self.lockins.items():
-                    log.write(f"#{key} Time Constant [s]: {self.lockin_settings[key]['TC']}\n")
-                    log.write(f"#{key} Sensitivity [V]: {self.lockin_settings[key]['sens']}\n")
-
-                log.write("#Field Input Voltage\n")
-                log.write("#Preamp gain\n")
-                header = "Timestamp,X_1f,Y_1f,X_2f,Y_2f,X_dc,Y_dc,X_mod,Y_mod\n"
-                log.write(header)
+            header = "".join(f"#{key} Time Constant [s]: {self.lockin_settings[key]['TC']}\n"
+                             f"#{key} Sensitivity [V]: {self.lockin_settings[key]['sens']}\n" for key in self.lockins)
+            header += "#Field Input Voltage\n"
+            header += "#Preamp gain\n"
+            header += "Timestamp,X_1f,Y_1f,X_2f,Y_2f,X_dc,Y_dc,X_mod,Y_mod\n"
 
-                for row in zip(*data):
-                    log.write(",".join(map(str, row)) + "\n")
+            # Transfer of each lock-in overlaps conversion of the previous one
+            self.lockin_pipeline.run(file_path, header, t0, self.lockin_settings["2f"]["interval"],
+                                     segments=self.lockin_segments, reference="2f")
+            self.lockin_segments.report()
         except Exception as e:
             print(f"An error occurred while saving data: {e}")
     
@@ -455,20 +513,56 @@ class Main:
         ]
 
         if exceeded:
-            print(f"Number of data points exceeds buffer length for: {', '.join(exceeded)}.")
-            return
+            print(f"Number of data points exceeds buffer length for: {', '.join(exceeded)}; "
+                  "their buffers will be drained and re-armed during the run.")
+
+        self.bus.reset_stats()
 
         if self.b.trigger_method == "INT":
-            start_time, elap_time, b_timestamps, g_timestamps, fields, temps = self.INT_trig_measure()
-            self.save_gaussmeter_data(gaussmeter_path, f"Gaussmeter_{dt.now().strftime('%Y-%m-%d')}.csv", g_timestamps, fields, temps)
-            self.b.get_buffer(wavelengthmeter_path, f"Bristol_{dt.now().strftime('%Y-%m-%d')}.csv", elap_time, b_timestamps)
+            start_time, elap_time, b_timestamps, g_timestamps, fields, t_timestamps, temps = self.INT_trig_measure()
+            self.save_gaussmeter_data(gaussmeter_path, f"Gaussmeter_{dt.now().strftime('%Y-%m-%d')}.csv", g_timestamps, fields, t_timestamps, temps)
+            self.b.get_buffer(wavelengthmeter_path, f"Bristol_{dt.now().strftime('%Y-%m-%d')}.csv", elap_time, b_timestamps,
+                              start_time=start_time, frame_period=self.INT_peri, trigger_times=self.trigger_times)
             self.get_lock_in_buffer(lockin_path, f"Faraday_lockins_{dt.now().strftime('%Y-%m-%d')}.lvm", start_time)
         else:
-            start_time, elap_time, timestamps, fields, temps = self.EXT_trig_measure()
-            self.save_gaussmeter_data(gaussmeter_path, f"Gaussmeter_{dt.now().strftime('%Y-%m-%d')}.csv", timestamps, fields, temps)
-            self.b.get_buffer(wavelengthmeter_path, f"Bristol_{dt.now().strftime('%Y-%m-%d')}.csv", elap_time, timestamps)
+            start_time, elap_time, timestamps, g_timestamps, fields, t_timestamps, temps = self.EXT_trig_measure()
+            self.save_gaussmeter_data(gaussmeter_path, f"Gaussmeter_{dt.now().strftime('%Y-%m-%d')}.csv", g_timestamps, fields, t_timestamps, temps)
+            self.b.get_buffer(wavelengthmeter_path, f"Bristol_{dt.now().strftime('%Y-%m-%d')}.csv", elap_time, timestamps,
+                              start_time=start_time, frame_period=self.EXT_peri, trigger_times=self.trigger_times)
             self.get_lock_in_buffer(lockin_path, f"Faraday_lockins_{dt.now().strftime('%Y-%m-%d')}.lvm", start_time)
-        
+        self.bus.report()
+
+
+    def edge_timestamper(self, lines):
+        """Counter-input timestamps of the given gate lines (name: DIO line) if enabled, otherwise an empty context."""
+        if not self.edge_timestamps:
+            return nullcontext()
+        return EdgeTimestamper(self.NI_channel, lines, max_rate=1 / self.EXT_peri)
+
+    def edge_times(self, edges, start_time, timestamps):
+        """
+        Replaces the software-estimated lock-in start time and Bristol trigger times with the hardware edge times.
+        The Bristol edges are kept in self.trigger_times, so the saved buffer is timestamped with them.
+        """
+        if edges is None:
+            return start_time, timestamps
+        edges.report()
+        lockin_edges = edges.times("lockins")
+        if len(lockin_edges):
+            start_time = lockin_edges[0]
+        if "bristol" in edges.lines:
+            bristol_edges = edges.times("bristol")
+            if len(bristol_edges) == len(timestamps):
+                timestamps = list(format_timestamps(bristol_edges))
+                self.trigger_times = bristol_edges
+            else:
+                print(f"{len(bristol_edges)} Bristol trigger edges for {len(timestamps)} triggers, keeping software timestamps.")
+        return start_time, timestamps
+
+    def live_status(self):
+        """Formats the latest streamed Bristol wavelength for the progress line."""
+        wavelength = self.b.live_wavelength if self.live_stream else None
+        return f"  Wavelength: {wavelength:.6f} nm" if wavelength is not None else ""
 
     def countdown(self, seconds):
         for i in range(seconds, -1, -1):
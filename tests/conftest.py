@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="module")
+def simulator():
+    """Bristol 871A simulator serving SCPI on a local port and RS-422 on a pseudo-terminal."""
+    if not hasattr(os, "openpty"):
+        pytest.skip("The Bristol simulator needs a pseudo-terminal (Unix only).")
+    from Bristol871.Bristol_871A_Simulator import SimulatedBristol871
+    with SimulatedBristol871(frame_rate=1000, banner_lines=2, seed=1) as sim:
+        yield sim
+
+
+@pytest.fixture(scope="module")
+def bristol(simulator):
+    """Bristol871 driver connected to the simulator."""
+    from Bristol871.Bristol_871A import Bristol871
+    host, port = simulator.address
+    b = Bristol871(simulator.serial_port, host, quiet=True, telnet_port=port)
+    yield b
+    b.tn.close()
@@ -0,0 +1,204 @@
+import time
+
+import numpy as np
+import pytest
+
+from Bristol871.Bristol_871A import Bristol871, BUFFER_DTYPE, MMEM_CAPACITY
+
+
+def buffered(scan_index):
+    data = np.zeros(len(scan_index), dtype=BUFFER_DTYPE)
+    data["scan_index"] = np.asarray(scan_index, dtype=np.int64).astype(np.uint32)
+    return data
+
+
+def test_decode_buffer_is_a_view_on_the_block():
+    data = buffered(np.arange(5))
+    data["wavelength"] = 770.108
+    block = bytearray(data.tobytes())
+    decoded = Bristol871.decode_buffer(block)
+    np.testing.assert_array_equal(decoded, data)
+    assert np.shares_memory(decoded, np.frombuffer(block, dtype=np.uint8))
+
+
+def test_fetch_buffer_from_simulator(bristol):
+    bristol.buffer_control("INIT")
+    bristol.buffer_control("OPEN")
+    time.sleep(0.05)                                                            # About 50 frames at 1 kHz
+    data = bristol.fetch_buffer()
+    assert data.dtype == BUFFER_DTYPE
+    assert len(data) >= 20
+    np.testing.assert_array_equal(np.diff(data["scan_index"].astype(np.int64)), 1)
+    np.testing.assert_allclose(data["wavelength"], 770.108, atol=1e-5)
+    np.testing.assert_allclose(data["power"], 0.5, atol=0.01)
+    assert not data["status"].any()
+
+
+def test_plan_segments():
+    assert Bristol871.plan_segments(10, 1000) == []
+    boundaries = Bristol871.plan_segments(3600, 1000)
+    segment_time = MMEM_CAPACITY * 0.9 / 1000
+    assert boundaries == pytest.approx([segment_time * (k + 1) for k in range(len(boundaries))])
+    assert boundaries[-1] < 3600 <= boundaries[-1] + segment_time
+
+
+def test_split_reply_keeps_quoted_separators():
+    assert Bristol871.split_reply('1;"a;b" ; 2') == ["1", '"a;b"', "2"]
+
+
+def test_batch_returns_replies_in_order(bristol):
+    replies = bristol.batch([":TRIG:SEQ:METH INT", ":TRIG:SEQ:METH?", "*IDN?"])
+    assert replies[0] is None
+    assert replies[1] == "INT"
+    assert replies[2] == bristol.idn
+
+
+def test_batch_error_names_the_failing_command(bristol):
+    with pytest.raises(Bristol871.BatchError) as error:
+        bristol.batch([":TRIG:SEQ:METH?", ":BOGUS 1", "*OPC?"])
+    assert list(error.value.errors) == [":BOGUS 1"]
+    assert error.value.replies == ["INT", None, "1"]
+
+
+class OfflineBristol871(Bristol871):
+    """Bristol871 without a connection, for the methods that only work on buffered data."""
+
+    def __init__(self):
+        self.segments = None
+
+    def __del__(self):
+        pass
+
+
+@pytest.fixture
+def offline():
+    return OfflineBristol871()
+
+
+def test_reconstruct_timestamps_fits_the_end_anchor(offline):
+    data = buffered(np.arange(1000, 2001))
+    times, report = offline.reconstruct_timestamps(data, 100.0, 1e-3, acq_time=1000 * 1.0001e-3)
+    assert report["fitted_period"] == pytest.approx(1.0001e-3)
+    assert times[0] == pytest.approx(100.0)
+    assert times[-1] == pytest.approx(100.0 + 1000 * 1.0001e-3)
+    assert report["missing_frames"] == report["duplicates"] == report["out_of_order"] == 0
+
+
+def test_reconstruct_timestamps_keeps_nominal_period_on_a_bad_fit(offline):
+    data = buffered(np.arange(100))
+    times, report = offline.reconstruct_timestamps(data, 0.0, 1e-3, acq_time=1.0)  # 10x too long
+    np.testing.assert_allclose(np.diff(times), 1e-3)
+
+
+def test_reconstruct_timestamps_reports_gaps_and_rollover(offline):
+    index = np.concatenate((np.arange(2**32 - 5, 2**32), np.arange(0, 5), np.arange(8, 10), [9]))
+    times, report = offline.reconstruct_timestamps(buffered(index), 0.0, 1e-3)
+    assert report["first_scan_index"] == 2**32 - 5
+    assert report["last_scan_index"] == 2**32 + 9
+    assert report["missing_frames"] == 3
+    assert report["gaps"].tolist() == [[10, 3]]
+    assert report["duplicates"] == 1
+    np.testing.assert_allclose(times[[0, 10]], [0.0, 13e-3])
+
+
+def test_decode_buffer_drops_a_partial_record(capsys):
+    data = buffered(np.arange(3))
+    decoded = Bristol871.decode_buffer(data.tobytes() + b"\x00" * 7)
+    np.testing.assert_array_equal(decoded, data)
+    assert "partial record" in capsys.readouterr().out
+
+
+def test_reconstruct_timestamps_uses_hardware_trigger_times(offline):
+    triggers = 50.0 + 0.1 * np.arange(8) + np.linspace(0, 1e-4, 8)
+    times, report = offline.reconstruct_timestamps(buffered(np.arange(5, 15)), 50.0, 0.1, acq_time=1.0,
+                                                   trigger_times=triggers)
+    np.testing.assert_array_equal(times[:8], triggers)
+    assert report["hardware_times"] == 8
+    assert times[9] == pytest.approx(50.9, abs=1e-3)                            # Past the last trigger: fitted
+
+
+def test_buffer_control_sends_one_terminated_line(offline):
+    sent = []
+
+    class Recorder(object):
+        def write(self, data):
+            sent.append(data)
+
+    offline._settings, offline.tn = {}, Recorder()
+    offline.buffer_control("OPEN")
+    assert sent == [b":MMEM:OPEN\r\n"]
+
+
+@pytest.mark.parametrize("message", [":TRIG:SEQ:METH EXT", ":TRIG:METH EXT", ":TRIGger:SEQuence:METHod RISE",
+                                     ":trig:meth fall", ":MMEM:OPEN;:TRIG:METH INT", "*RST"])
+def test_raw_writes_invalidate_any_spelling(offline, message):
+    offline.tn = type("Sink", (), {"write": lambda self, data: None})()
+    offline._settings = {":TRIG:SEQ:METH": "INT", ":SENS:EXP:AUTO": "ON"}
+    offline.write(message)
+    assert ":TRIG:SEQ:METH" not in offline._settings
+
+
+def test_unrelated_writes_keep_the_cache(offline):
+    offline.tn = type("Sink", (), {"write": lambda self, data: None})()
+    offline._settings = {":TRIG:SEQ:METH": "INT", ":SENS:CALI:METH": "TEMP", ":TRIG:SEQ:RATE": 1000}
+    offline.write(":SENS:CALI:TEMP 5;:TRIG:SEQ:METH?;:MMEM:OPEN")
+    assert offline._settings == {":TRIG:SEQ:METH": "INT", ":SENS:CALI:METH": "TEMP", ":TRIG:SEQ:RATE": 1000}
+    offline.write(":TRIGger:RATE:ADJust")
+    assert ":TRIG:SEQ:RATE" not in offline._settings
+    offline.write(":SENSe:CALIbration")
+    assert offline._settings == {}
+
+
+def test_written_and_read_values_are_cached_alike(bristol):
+    bristol.invalidate_settings()
+    bristol.calibration_method = "TIME"
+    written = bristol.calibration_method
+    bristol.invalidate_settings()
+    assert bristol.calibration_method == written == "TIME"
+    assert Bristol871.canonical_setting("TEMPerature") == "TEMP"
+    assert Bristol871.canonical_setting("1") == "ON"
+    bristol.calibration_method = "TEMP"
+
+
+def test_batch_counts_replaced_round_trips(bristol):
+    saved = bristol.batch_stats["round_trips_saved"]
+    bristol.batch([":TRIG:SEQ:METH INT", ":SENS:EXP:AUTO ON", ":TRIG:SEQ:METH?"])
+    assert bristol.batch_stats["round_trips_saved"] - saved == 2
+
+
+@pytest.mark.parametrize("name, value", [("frame_rate", 1234), ("trigger_method", "BOGUS"),
+                                         ("average_count", 500), ("calibration_timer", 60)])
+def test_configure_and_setters_reject_the_same_values(bristol, name, value):
+    bristol.calibration_method = "TEMP"
+    with pytest.raises(ValueError) as configured:
+        bristol.configure(**{name: value})
+    with pytest.raises(ValueError) as set_directly:
+        if isinstance(getattr(Bristol871, name), property):
+            setattr(bristol, name, value)
+        else:
+            getattr(bristol, name)(value)
+    assert str(configured.value) == str(set_directly.value)
+
+
+def test_reconstruct_timestamps_unwraps_segment_anchors(offline):
+    period = 1.0001e-3
+    index = np.arange(2**32 - 600, 2**32 + 600)
+    closed = 10.0 + 599 * period
+    offline.segments = [
+        {"segment": 0, "opened": 10.0, "closed": closed, "num_samples": 600,
+         "first_scan_index": 2**32 - 600, "last_scan_index": 2**32 - 1},
+        {"segment": 1, "opened": closed + period, "closed": 10.0 + 1199 * period, "num_samples": 600,
+         "first_scan_index": 0, "last_scan_index": 599},
+    ]
+    times, report = offline.reconstruct_timestamps(buffered(index), 10.0, 1e-3)
+    assert report["fitted_period"] == pytest.approx(period)
+    np.testing.assert_allclose(times, 10.0 + np.arange(1200) * period)
+
+
+def test_drain_segment_counts_missed_frames_across_a_rollover(offline, monkeypatch):
+    blocks = iter([buffered(np.arange(2**32 - 10, 2**32 - 2)).tobytes(), buffered(np.arange(0, 5)).tobytes()])
+    monkeypatch.setattr(offline, "query_block", lambda *commands: next(blocks))
+    offline.segments, offline._segment_data, offline._segment_opened = [], [], 0.0
+    offline.drain_segment(reopen=False)
+    offline.drain_segment(reopen=False)
+    assert [seg["missed_frames"] for seg in offline.segments] == [None, 2]
@@ -0,0 +1,47 @@
+from time import perf_counter
+
+import numpy as np
+
+from Timing.Deadline_Scheduler import DeadlineScheduler
+
+
+def test_ticks_are_not_early_and_do_not_drift():
+    times = np.arange(20) * 0.005
+    ticks = DeadlineScheduler(times)
+    woke = []
+    t0 = perf_counter()
+    for i in ticks.run(t0):
+        woke.append(perf_counter() - t0)
+    assert ticks.count == 20
+    assert np.all(np.asarray(woke) >= times)
+    assert np.all(ticks.lateness >= 0)
+    assert woke[-1] - times[-1] < 0.05                                          # Lateness does not accumulate
+
+
+def test_late_tick_does_not_shift_the_schedule():
+    ticks = DeadlineScheduler([0.0, 0.01, 0.02, 0.03], overrun=0.005)
+    t0 = perf_counter()
+    for i in ticks.run(t0):
+        if i == 0:
+            while perf_counter() - t0 < 0.025:                                  # Overrun past the next deadline
+                pass
+    assert ticks.lateness[1] > 0.01
+    assert ticks.overruns >= 1
+    assert ticks.lateness[3] < ticks.lateness[1]
+
+
+def test_report_and_partial_run():
+    ticks = DeadlineScheduler(np.arange(10) * 0.001)
+    for i in ticks.run():
+        if i == 4:
+            break
+    report = ticks.report("Test loop")
+    assert report["ticks"] == 5
+    assert np.isnan(ticks.lateness[5:]).all()
+    assert DeadlineScheduler([]).report() == {}
+
+
+def test_busy_wait_and_timerfd_options():
+    for options in ({"yield_cpu": False}, {"timerfd": True}):
+        with DeadlineScheduler([0.0, 0.002], **options) as ticks:
+            assert list(ticks.run()) == [0, 1]
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pymeasure")
+
+from pymeasure.test import expected_protocol
+
+from DSP7265LockIn import DSP7265_Binary
+from DSP7265LockIn.DSP7265_Binary import DSP7265Binary
+
+
+@pytest.fixture
+def lockin():
+    return DSP7265Binary.__new__(DSP7265Binary)                                  # Conversion needs no connection
+
+
+def test_binary_quantities_are_scaled_as_arrays(lockin):
+    converted = lockin.buffer_to_float({"x": np.array([10000, -5000], dtype=np.int16),
+                                        "phase": np.array([9000, -4500], dtype=np.int16)}, sensitivity=1e-3)
+    np.testing.assert_allclose(converted["x"], [1e-3, -5e-4])
+    np.testing.assert_allclose(converted["phase"], [90.0, -45.0])
+
+
+def test_fallback_passes_arrays_to_pymeasure(lockin):
+    converted = lockin.buffer_to_float({"x": np.array([10000, -5000], dtype=np.int16),
+                                        "noise": np.array([100, 200])}, sensitivity=1e-3)
+    np.testing.assert_allclose(converted["x"], [1e-3, -5e-4])
+    np.testing.assert_allclose(converted["noise"], [1e-5, 2e-5])
+
+
+@pytest.fixture
+def cold_cache(monkeypatch):
+    monkeypatch.setattr(DSP7265_Binary, "_SETTINGS_CACHE", {})
+
+
+def test_cold_configure_reads_the_state_in_one_query(cold_cache):
+    with expected_protocol(DSP7265Binary, [("REFN;REFP.;TC", "1,10.00,10"), ("TC 11", None)]) as lockin:
+        changes = lockin.configure({"harmonic": 1, "phase": 10.0, "TC": 0.1})
+    assert changes == {"TC": (0.05, 0.1)}
+
+
+def test_settings_cache_outlives_the_instance(cold_cache):
+    settings = {"harmonic": 1, "phase": 10.0, "TC": 0.1}
+    with expected_protocol(DSP7265Binary, [("REFN;REFP.;TC", "1,10.00,11")], name="A") as lockin:
+        assert lockin.configure(settings) == {}
+    with expected_protocol(DSP7265Binary, [], name="A") as lockin:                # Next run: no I/O at all
+        assert lockin.configure(settings) == {}
+
+
+def test_dump_buffer_reads_a_halted_buffer_in_ascii():
+    with expected_protocol(DSP7265Binary, [("M", "5,0,0,2"), ("DC 0", "100"), (None, "-200"),
+                                           ("DC 1", "300"), (None, "400")]) as lockin:
+        lockin.binary_curves = False
+        raw = lockin.dump_buffer(("x", "y"))
+    np.testing.assert_array_equal(raw["x"], [100, -200])
+    np.testing.assert_array_equal(raw["y"], [300, 400])
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+pyvisa = pytest.importorskip("pyvisa")
+
+from GPIBBus.GPIB_Arbiter import GPIBArbiter, TIME_CRITICAL, NORMAL, BULK
+
+
+@pytest.fixture
+def arbiter(monkeypatch):
+    monkeypatch.setattr(pyvisa, "ResourceManager", lambda visa_library="": object())
+    return GPIBArbiter()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_waiting_transactions_are_granted_by_priority(arbiter):
+    order = []
+
+    def transaction(name, priority):
+        with arbiter.transaction(name, priority):
+            order.append(name)
+
+    arbiter.acquire("holder", NORMAL)
+    threads = []
+    for name, priority in (("bulk", BULK), ("normal", NORMAL), ("critical", TIME_CRITICAL)):
+        threads.append(threading.Thread(target=transaction, args=(name, priority)))
+        threads[-1].start()
+        wait_for(lambda: arbiter._waiting[priority] == 1)
+    arbiter.release()
+    for thread in threads:
+        thread.join(2)
+
+    assert order == ["critical", "normal", "bulk"]
+    assert arbiter._waiting == [0, 0, 0]
+
+
+def test_transactions_are_reentrant_within_a_thread(arbiter):
+    class Instrument(object):
+        def ask(self, command):
+            return command
+
+        def values(self, command):
+            return [self.ask(command)]
+
+    instrument = arbiter.attach(Instrument(), "lock-in", BULK)
+    assert instrument.values("X.") == ["X."]
+    assert arbiter.stats["lock-in"]["transactions"] == 1
+    assert arbiter._owner is None
+
+
+def test_holder_is_not_interrupted(arbiter):
+    arbiter.acquire("bulk", BULK)
+    granted = threading.Event()
+
+    def critical():
+        with arbiter.transaction("gaussmeter", TIME_CRITICAL):
+            granted.set()
+
+    thread = threading.Thread(target=critical)
+    thread.start()
+    assert not granted.wait(0.05)
+    arbiter.release()
+    assert granted.wait(2)
+    thread.join(2)
@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+
+from Lakeshore475DSPGaussmeter.Lakeshore475 import LakeShore475
+
+
+class FakeDevice(object):
+    """Answers the datalog commands of a LakeShore 475 that logged `points` readings."""
+
+    def __init__(self, points):
+        self.points = points
+        self.sent = []
+
+    def write(self, command):
+        self.sent.append(command)
+
+    def close(self):
+        pass
+
+    def query(self, command):
+        self.sent.append(command)
+        if command == "DLOGNUM?":
+            return f"{self.points}\r\n"
+        return ";".join(f"{int(unit.split()[1]) * 0.5:+.4E}" for unit in command.split(";")) + "\r\n"
+
+
+def offline_gaussmeter(points):
+    gaussmeter = LakeShore475.__new__(LakeShore475)
+    gaussmeter.device = FakeDevice(points)
+    gaussmeter._log_thread = gaussmeter._log_result = None
+    gaussmeter._fast_thread = gaussmeter._sampler_thread = None
+    return gaussmeter
+
+
+def test_get_log_data_sends_points_per_query_in_one_transaction():
+    gaussmeter = offline_gaussmeter(20)
+    data = gaussmeter.get_log_data(20, points_per_query=8, progress=False)
+    np.testing.assert_allclose(data, 0.5 * np.arange(1, 21))
+    assert len(gaussmeter.device.sent) == 3
+
+
+def test_record_log_does_not_block_the_caller():
+    gaussmeter = offline_gaussmeter(10)
+    start = time.perf_counter()
+    gaussmeter.record_log(0.3, rate=100)
+    assert time.perf_counter() - start < 0.1 and not gaussmeter.log_ready
+    assert gaussmeter.log_data(timeout=0.01) is None
+    times, fields = gaussmeter.log_data(timeout=5)
+    assert gaussmeter.log_ready
+    np.testing.assert_allclose(times, np.arange(10) / 100)
+    np.testing.assert_allclose(fields, 0.5 * np.arange(1, 11))
+    assert gaussmeter.device.sent[:2] == ["DLOGSET 4", "DLOG 1"]
+    assert "DLOG 0" in gaussmeter.device.sent
@@ -0,0 +1,50 @@
+import numpy as np
+
+from DSP7265LockIn.LockIn_Pipeline import LockInBufferPipeline
+
+
+class FakeLockIn(object):
+    curve_buffer_status = [0, 1, 0, 3]
+
+    def get_buffer(self, quantity=None, convert_to_float=True, wait_for_buffer=True):
+        return {"x": np.arange(3), "y": -np.arange(3)}
+
+    def buffer_to_float(self, buffer_data, sensitivity=None, sensitivity2=None, raise_error=True):
+        return buffer_data
+
+
+class FakeSegments(object):
+    segmented = True
+
+    def __init__(self, starts):
+        self.starts = starts
+
+    def stitch(self, name, X, Y):
+        return X, Y
+
+    def point_times(self, name, t0, n):
+        return self.starts[name] + np.arange(n) * 0.1
+
+
+def run(tmp_path, starts):
+    pipeline = LockInBufferPipeline({"1f": FakeLockIn(), "2f": FakeLockIn()}, {"1f": {"sens": 1, "interval": 0.1},
+                                                                             "2f": {"sens": 1, "interval": 0.1}})
+    file_path = tmp_path / "lockin.lvm"
+    pipeline.run(str(file_path), "#comment\nTimestamp,X_1f,Y_1f,X_2f,Y_2f\n", 0.0, 0.1,
+                 segments=FakeSegments(starts), reference="2f")
+    return file_path.read_text().splitlines()
+
+
+def test_aligned_segments_share_one_timestamp_column(tmp_path):
+    lines = run(tmp_path, {"1f": 1e9, "2f": 1e9 + 0.01})
+    assert lines[1] == "Timestamp,X_1f,Y_1f,X_2f,Y_2f"
+    assert len(lines) == 5 and all(len(line.split(",")) == 5 for line in lines[2:])
+
+
+def test_misaligned_segments_get_a_timestamp_column_each(tmp_path):
+    lines = run(tmp_path, {"1f": 1e9, "2f": 1e9 + 0.5})
+    assert lines[0] == "#comment"
+    assert lines[1] == "Timestamp_1f,X_1f,Y_1f,Timestamp_2f,X_2f,Y_2f"
+    assert len(lines) == 5
+    first = lines[2].split(",")
+    assert first[0] != first[3] and first[1:3] == first[4:6] == ["0.0", "0.0"]
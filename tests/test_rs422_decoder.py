@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from Bristol871.RS422_Decoder import RS422Decoder, RecordRingBuffer, RECORD_DTYPE, START_TOKEN, ESCAPE_TOKEN
+from Bristol871.Bristol_871A_Simulator import SimulatedBristol871
+
+
+def make_records(first, count):
+    records = np.zeros(count, dtype=RECORD_DTYPE)
+    records["scan_index"] = np.arange(first, first + count)
+    records["wavelength"] = 770.108 + 1e-6 * np.arange(count)
+    records["power"] = 0.5
+    # Every record contains bytes that have to be escaped
+    records["status"] = START_TOKEN | ESCAPE_TOKEN << 8
+    return records
+
+
+def encode(records):
+    return b"".join(SimulatedBristol871.frame(record) for record in records)
+
+
+def decode_in_chunks(stream, size):
+    decoder = RS422Decoder()
+    batches = [decoder.feed(stream[i:i + size]) for i in range(0, len(stream), size)]
+    return decoder, np.concatenate(batches)
+
+
+def test_escaped_records_round_trip():
+    records = make_records(0, 50)
+    decoder, decoded = decode_in_chunks(encode(records), len(encode(records)))
+    np.testing.assert_array_equal(decoded, records)
+    assert decoder.decoded_frames == 50
+    assert decoder.corrupt_frames == decoder.dropped_frames == 0
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 20, 21, 41, 64, 1000])
+def test_chunking_does_not_change_the_result(size):
+    records = make_records(100, 40)
+    stream = encode(records)
+    decoder, decoded = decode_in_chunks(stream, size)
+    np.testing.assert_array_equal(decoded, records[:len(decoded)])
+    # Only the last frame may still wait for the next START token
+    assert len(decoded) >= len(records) - 1
+    assert decoder.corrupt_frames == 0
+
+
+def test_leading_garbage_is_skipped():
+    records = make_records(0, 5)
+    decoder = RS422Decoder()
+    decoded = decoder.feed(b"\x01\x02\x03" + encode(records))
+    np.testing.assert_array_equal(decoded, records)
+
+
+def test_dropped_frames_are_counted_across_chunks():
+    records = make_records(0, 10)
+    stream = encode(np.concatenate((records[:4], records[7:])))
+    decoder, decoded = decode_in_chunks(stream, 13)
+    assert decoder.dropped_frames == 3
+    np.testing.assert_array_equal(decoded["scan_index"], [0, 1, 2, 3, 7, 8, 9])
+
+
+def test_dropped_frames_are_counted_across_a_rollover():
+    records = np.concatenate((make_records(2**32 - 3, 3), make_records(0, 5)))
+    stream = encode(np.concatenate((records[:2], records[4:])))
+    decoder, decoded = decode_in_chunks(stream, 13)
+    assert decoder.dropped_frames == 2
+
+
+def test_truncated_frame_is_counted_as_corrupt():
+    records = make_records(0, 3)
+    frames = [SimulatedBristol871.frame(record) for record in records]
+    decoder = RS422Decoder()
+    decoded = decoder.feed(frames[0] + frames[1][:10] + frames[2])
+    assert decoder.corrupt_frames == 1
+    np.testing.assert_array_equal(decoded["scan_index"], [0, 2])
+
+
+def test_ring_buffer_wraps_and_reports_lost_records():
+    ring = RecordRingBuffer(8)
+    ring.write(make_records(0, 5))
+    records, index, lost = ring.read_since(0)
+    np.testing.assert_array_equal(records["scan_index"], np.arange(5))
+    assert (index, lost) == (5, 0)
+
+    ring.write(make_records(5, 10))                                             # Laps the reader by 7 records
+    records, index, lost = ring.read_since(index)
+    np.testing.assert_array_equal(records["scan_index"], np.arange(7, 15))
+    assert (index, lost) == (15, 2)
+    assert ring.latest()["scan_index"] == 14
+    np.testing.assert_array_equal(ring.snapshot(3)["scan_index"], [12, 13, 14])
+
+
+def test_ring_buffer_write_larger_than_capacity():
+    ring = RecordRingBuffer(4)
+    ring.write(make_records(0, 10))
+    assert ring.total == 10
+    np.testing.assert_array_equal(ring.snapshot()["scan_index"], [6, 7, 8, 9])
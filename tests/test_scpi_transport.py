@@ -0,0 +1,50 @@
+import asyncio
+import threading
+from time import perf_counter
+
+import pytest
+
+from Bristol871.SCPI_Transport import TelnetTransport
+from Bristol871.Bristol_871A_Simulator import IDN
+
+
+@pytest.fixture
+def transport(simulator):
+    tn = TelnetTransport(*simulator.address)
+    tn.drain(0.05)
+    yield tn
+    tn.close()
+
+
+def test_sync_and_async_queries_do_not_interleave(transport):
+    replies = {"sync": [], "async": []}
+
+    def sync_queries():
+        for _ in range(100):
+            replies["sync"].append(transport.query("*IDN?"))
+
+    async def async_queries():
+        for _ in range(100):
+            replies["async"].append(await transport.awaitable(transport.client.query(":SENS:DET:FUNC?")))
+
+    thread = threading.Thread(target=sync_queries)
+    thread.start()
+    asyncio.run(async_queries())
+    thread.join(10)
+    assert replies["sync"] == [IDN] * 100
+    assert replies["async"] == ["CW"] * 100
+
+
+def test_rawq_getchar_times_out_on_a_silent_instrument(transport):
+    start = perf_counter()
+    with pytest.raises(TimeoutError):
+        transport.rawq_getchar(timeout=0.2)
+    assert perf_counter() - start < 2
+
+
+def test_close_is_idempotent(simulator):
+    tn = TelnetTransport(*simulator.address)
+    tn.close()
+    tn.close()
+    with pytest.raises(ConnectionError):
+        tn.query("*IDN?")
@@ -0,0 +1,35 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from Timing.Timestamps import format_timestamps
+
+
+@pytest.fixture
+def berlin():
+    if not hasattr(time, "tzset"):
+        pytest.skip("Setting the time zone needs time.tzset (Unix only).")
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = "Europe/Berlin"
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+
+
+def test_format_timestamps_follows_a_daylight_saving_change(berlin):
+    change = 1711846800.0                                                       # 2024-03-31 01:00 UTC, CET -> CEST
+    stamps = format_timestamps(change + np.array([-0.25, 0.0, 3600.5]))
+    assert stamps.tolist() == ["2024-03-31T01:59:59.750", "2024-03-31T03:00:00.000", "2024-03-31T04:00:00.500"]
+
+
+def test_format_timestamps_matches_strftime(berlin):
+    times = 1.7e9 + np.array([0.0, 0.123, 86400.999])
+    expected = [time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(int(t))) + f".{round(t % 1 * 1000):03d}" for t in times]
+    assert format_timestamps(times).tolist() == expected
+    assert format_timestamps([]).tolist() == []